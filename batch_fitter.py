@@ -0,0 +1,279 @@
+import os
+import csv
+import glob
+import config
+import collections
+import argparse
+import traceback
+import fit_models
+import parallel_executor
+from lab_fit_exception import LabFitException
+from streaming_input_parser import create_input_parser
+from fit_linear_calculator import FitLinearCalculator
+from fit_model_calculator import FitModelCalculator
+from result_cache import ResultCache
+
+class BatchFitter(object):
+	"""
+	Fits many input files in a single process
+	and writes all the results into one table
+	"""
+	def __init__(self, bonus = False, adaptive = False, iterative = False,
+				 workers = config.DEFAULT_WORKERS, plot_directory = None,
+				 plot_format = config.DEFAULT_PLOT_FORMAT, result_cache = None):
+		super(BatchFitter, self).__init__()
+		self.bonus = bonus
+		self.adaptive = adaptive
+		self.iterative = iterative
+		self.workers = workers
+		# If not none every file's fit is plotted into this directory
+		self.plot_directory = plot_directory
+		self.plot_format = plot_format
+		# The plot name of every file path of the batch, see self.create_plot_names
+		self.plot_names = {}
+		# If not none the ResultCache of repeated files
+		self.result_cache = result_cache
+
+	def collect_file_paths(self, source):
+		"""
+		Collects the input file paths of the batch
+		source - a directory, all of its files are used
+				 a manifest file, holding one file path in each line,
+				 relative paths are relative to the manifest's directory
+				 or a glob pattern
+		"""
+		if os.path.isdir(source):
+			file_paths = [os.path.join(source, file_name) for file_name in sorted(os.listdir(source))]
+			file_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
+		elif os.path.isfile(source):
+			file_paths = self.read_manifest(source)
+		else:
+			file_paths = sorted(glob.glob(source))
+
+		if len(file_paths) == 0:
+			raise LabFitException(config.NO_BATCH_FILES.format(source))
+
+		return file_paths
+
+	def read_manifest(self, manifest_path):
+		"""
+		Reads the file paths from a manifest file
+		ignores empty rows and rows starting with config.BATCH_MANIFEST_COMMENT
+		"""
+		manifest_directory = os.path.dirname(manifest_path)
+		file_paths = []
+		with open(manifest_path, 'r') as f:
+			for row in f:
+				row = row.strip()
+				if len(row) == 0 or row.startswith(config.BATCH_MANIFEST_COMMENT):
+					continue
+				file_paths.append(os.path.join(manifest_directory, row))
+
+		return file_paths
+
+	def fit_file(self, file_path):
+		"""
+		Fits a single input file
+		returns the result row, errors are reported in its status
+		so a bad file will not stop the batch
+		"""
+		result = dict.fromkeys(config.RESULT_COLUMNS, '')
+		result[config.RESULT_FILE_PATH_KEY] = file_path
+		output_dict = None
+		try:
+			if self.result_cache is not None:
+				cache_key = self.result_cache.create_key(file_path, self.create_cache_options())
+				if self.load_cached_result(cache_key, file_path, result):
+					return result
+			input_parser = create_input_parser(file_path, contains_ab_values = self.bonus)
+			file_input = input_parser.start()
+			calculator = self.create_calculator(file_input)
+			output_dict = calculator.create_output_dict()
+			if self.plot_directory is not None:
+				calculator.plot(save_plot_name = self.create_plot_name(file_path),
+								plot_format = self.plot_format)
+			# Values are filled only once every output was written,
+			# so a failed row holds none
+			result.update(output_dict)
+			result[config.RESULT_STATUS_KEY] = config.RESULT_STATUS_OK
+		except LabFitException as e:
+			result[config.RESULT_STATUS_KEY] = e.message
+			output_dict = None
+		except Exception as e:
+			result[config.RESULT_STATUS_KEY] = "{0} {1}".format(config.UNKNOWN_ERROR, repr(e))
+			output_dict = None
+
+		# Caching is outside the fit's errors, it can not fail a fitted file
+		if self.result_cache is not None and output_dict is not None:
+			self.store_result(cache_key, file_path, output_dict)
+		return result
+
+	def create_calculator(self, file_input):
+		"""
+		Fits the model chosen by the input file, linear by default
+		returns the calculator of the fit
+		only models of the a and b parameters fit the results table,
+		other models are rejected
+		"""
+		model = fit_models.create_input_model(file_input)
+		if model.NAME == fit_models.LinearModel.NAME:
+			calculator = FitLinearCalculator(file_input)
+			calculator.calculate(chose_ab = self.bonus, adaptive = self.adaptive,
+								 iterative = self.iterative)
+			return calculator
+
+		if model.get_parameter_names() != [config.RESULT_A_KEY, config.RESULT_B_KEY]:
+			raise LabFitException(config.BATCH_UNSUPPORTED_MODEL.format(model.NAME))
+		calculator = FitModelCalculator(file_input, model)
+		calculator.calculate()
+		return calculator
+
+	def create_cache_options(self):
+		"""
+		Creates the options which change a file's result, for the cache key
+		"""
+		return {'batch': True, 'bonus': self.bonus, 'adaptive': self.adaptive,
+				'iterative': self.iterative, 'plot': self.plot_directory is not None,
+				'plot_format': self.plot_format}
+
+	def load_cached_result(self, cache_key, file_path, result):
+		"""
+		Updates result with the cached result of cache_key and restores
+		its plot, returns false if there is no cached result
+		"""
+		entry = self.result_cache.load(cache_key)
+		if entry is None:
+			return False
+		for plot_name in entry['plots']:
+			self.result_cache.restore_plot(entry, plot_name, self.create_plot_path(file_path))
+		result.update(entry['result'])
+		result[config.RESULT_STATUS_KEY] = config.RESULT_STATUS_OK
+		return True
+
+	def store_result(self, cache_key, file_path, output_dict):
+		plot_paths = {}
+		if self.plot_directory is not None:
+			plot_paths[config.LINEAR_PLOT_FILE_NAME + '.' + self.plot_format] = self.create_plot_path(file_path)
+		self.result_cache.store(cache_key, result = output_dict, plot_paths = plot_paths)
+
+	def create_plot_path(self, file_path):
+		return self.create_plot_name(file_path) + '.' + self.plot_format
+
+	def create_plot_name(self, file_path):
+		"""
+		Creates the plot path of file_path's fit, in self.plot_directory
+		named by self.plot_names, or if it is not a file of the batch
+		after the input file, without its extension
+		"""
+		file_name = self.plot_names.get(file_path, os.path.splitext(os.path.basename(file_path))[0])
+		return os.path.join(self.plot_directory, file_name)
+
+	def create_plot_names(self, file_paths):
+		"""
+		Names the plot of every file after its path relative to the files'
+		common directory, without its extension, so same named files of
+		different directories do not overwrite each other's plots
+		files whose names are still equal are named by their index as well
+		returns a dictionary of every file path's plot name
+		"""
+		absolute_paths = [os.path.abspath(file_path) for file_path in file_paths]
+		common_directory = os.path.commonpath([os.path.dirname(file_path) for file_path in absolute_paths])
+		names = [os.path.splitext(os.path.relpath(file_path, common_directory))[0] \
+				 .replace(os.sep, config.BATCH_PLOT_NAME_SEPARATOR) for file_path in absolute_paths]
+		name_counts = collections.Counter(names)
+		return {file_path: name if name_counts[name] == 1 else config.BATCH_PLOT_INDEX_FORMAT.format(name, index) \
+				for index, (file_path, name) in enumerate(zip(file_paths, names))}
+
+	def create_plot_directory(self):
+		"""
+		Creates self.plot_directory if it does not exist
+		"""
+		try:
+			os.makedirs(self.plot_directory, exist_ok = True)
+		except OSError as e:
+			raise LabFitException(config.INVALID_PLOT_DIRECTORY.format(self.plot_directory))
+
+	def fit_files(self, file_paths):
+		"""
+		Fits every file, yields the result rows in the files order
+		if self.workers is above 1 the files are spread between worker processes
+		"""
+		if self.workers > 1:
+			for result in parallel_executor.map_in_order(self.fit_file, file_paths, self.workers):
+				yield result
+			return
+
+		for file_path in file_paths:
+			yield self.fit_file(file_path)
+
+	def write_results(self, results, output_path):
+		"""
+		Writes the result rows into a csv table with config.RESULT_COLUMNS
+		the rows are written as they are fitted
+		returns the amount of rows and the amount of failed rows
+		"""
+		rows_amount = 0
+		failed_amount = 0
+		with open(output_path, 'w', newline = '') as f:
+			writer = csv.DictWriter(f, fieldnames = config.RESULT_COLUMNS)
+			writer.writeheader()
+			for result in results:
+				writer.writerow(result)
+				rows_amount += 1
+				if result[config.RESULT_STATUS_KEY] != config.RESULT_STATUS_OK:
+					failed_amount += 1
+
+		return rows_amount, failed_amount
+
+	def start(self, source, output_path):
+		file_paths = self.collect_file_paths(source)
+		if self.plot_directory is not None:
+			self.create_plot_directory()
+			self.plot_names = self.create_plot_names(file_paths)
+		return self.write_results(self.fit_files(file_paths), output_path)
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Fits a function to every data set of a batch')
+	parser.add_argument('-s','--source', help='directory, manifest file or glob of data files',
+						required=True)
+	parser.add_argument('-o','--output', help='results table path', default=config.BATCH_OUTPUT_DEFAULT)
+	parser.add_argument('-b','--bonus', help='bonus data files', action="store_true")
+	parser.add_argument('-a','--adaptive', help='coarse to fine search of the bonus a and b values',
+						action="store_true")
+	parser.add_argument('-i','--iterative', help='effective variance fit of the accurate chi, without a grid',
+						action="store_true")
+	parser.add_argument('-w','--workers', help='amount of worker processes', type=int,
+						default=config.DEFAULT_WORKERS)
+	parser.add_argument('-d','--plot_directory', help='directory to plot every fit into')
+	parser.add_argument('-p','--plot_format', help='plot file format', choices=config.PLOT_FORMATS,
+						default=config.DEFAULT_PLOT_FORMAT)
+	parser.add_argument('--no_cache', help='fit again even files fitted before with the same options',
+						action="store_true")
+	parser.add_argument('--cache_dir', help='directory of the fit result cache',
+						default=config.RESULT_CACHE_DIRECTORY)
+	args = vars(parser.parse_args())
+	return args
+
+def main(source, output_path, bonus = False, adaptive = False, iterative = False,
+		 workers = config.DEFAULT_WORKERS, plot_directory = None,
+		 plot_format = config.DEFAULT_PLOT_FORMAT, no_cache = False,
+		 cache_directory = config.RESULT_CACHE_DIRECTORY):
+	try:
+		result_cache = ResultCache(cache_directory) if not no_cache else None
+		batch_fitter = BatchFitter(bonus = bonus, adaptive = adaptive, iterative = iterative,
+								   workers = workers, plot_directory = plot_directory,
+								   plot_format = plot_format, result_cache = result_cache)
+		rows_amount, failed_amount = batch_fitter.start(source, output_path)
+		print(config.BATCH_OUTPUT_FORMAT.format(rows_amount, failed_amount, output_path))
+	except LabFitException as e:
+		print(e.message)
+	except Exception as e:
+		print("{0}:".format(config.UNKNOWN_ERROR))
+		traceback.print_exc()
+
+if __name__ == '__main__':
+	args_dict = parse_args()
+	main(args_dict['source'], args_dict['output'], args_dict['bonus'],
+		 args_dict['adaptive'], args_dict['iterative'], args_dict['workers'],
+		 args_dict['plot_directory'], args_dict['plot_format'], args_dict['no_cache'],
+		 args_dict['cache_dir'])
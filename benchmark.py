@@ -0,0 +1,367 @@
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import subprocess
+import tracemalloc
+import argparse
+import tempfile
+import config
+import numpy as np
+from input_parser import InputParser
+from fit_models import LinearModel
+from fit_linear_calculator import FitLinearCalculator
+from bootstrap_estimator import BootstrapEstimator
+from weighted_sums import create_weighted_sums
+
+PARSE_ROWS_AMOUNTS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+# The amount of a values and of b values of the grid stage
+GRID_SIZES = [16, 64]
+INPUT_FORMATS = ['column', 'row']
+STARTUP_OUTPUT_FORMAT = "{0:<14} {1:>10} {2:>12.6f} s"
+BENCHMARK_OUTPUT_FORMAT = "{0:<14} {1:>10} {2:>12.6f} s {3:>14.0f} rows/s {4:>10.1f} ns/row"
+MEMORY_OUTPUT_FORMAT = " {0:>10.1f} MB peak"
+# The x offsets of the sums benchmark, like timestamps are
+SUMS_OFFSETS = [0, 10 ** 6, 10 ** 9]
+SUMS_ERROR_FORMAT = "{0:<14} {1:>10} {2:>12.0e} offset {3:>10.2e} a error {4:>10.2e} b error"
+
+def create_data_values(rows_amount, seed = 0):
+	"""
+	Creates the x and y values of a noisy linear function
+	"""
+	random_generator = np.random.default_rng(seed)
+	x_values = np.arange(rows_amount, dtype = np.float64)
+	y_values = 2 * x_values + 1 + random_generator.normal(0, 0.1, rows_amount)
+	return x_values, y_values
+
+def create_column_input_text(rows_amount, leading_empty_rows = 0, seed = 0):
+	"""
+	Creates the text of a column type input file with rows_amount
+	data rows of a noisy linear function
+	leading_empty_rows - the amount of empty rows before the titles
+	"""
+	x_values, y_values = create_data_values(rows_amount, seed)
+	data_rows = ["{0:.6f} {1:.6f} {2:.6f} {3:.6f}".format(x, 0.01, y, 0.1) \
+				 for x, y in zip(x_values, y_values)]
+	return "\n" * leading_empty_rows + "x dx y dy\n" + "\n".join(data_rows) + \
+		   "\n\nx axis: x\ny axis: y\n"
+
+def create_row_input_text(rows_amount, seed = 0):
+	"""
+	Creates the text of a row type input file with rows_amount
+	data points of a noisy linear function
+	"""
+	x_values, y_values = create_data_values(rows_amount, seed)
+	data_rows = []
+	for title, values in (('x', x_values), ('dx', np.full(rows_amount, 0.01)),
+						  ('y', y_values), ('dy', np.full(rows_amount, 0.1))):
+		data_rows.append(title + ' ' + ' '.join("{0:.6f}".format(value) for value in values))
+	return "\n".join(data_rows) + "\n\nx axis: x\ny axis: y\n"
+
+INPUT_TEXT_CREATORS = {'column': create_column_input_text,
+					   'row': create_row_input_text}
+
+def write_temporary_input(text):
+	"""
+	Writes text into a temporary input file and returns its path
+	"""
+	file_descriptor, file_path = tempfile.mkstemp(suffix = '.txt')
+	with os.fdopen(file_descriptor, 'w') as f:
+		f.write(text)
+	return file_path
+
+def time_call(function, repeats):
+	"""
+	Returns the best wall time in seconds of repeats calls to function
+	"""
+	best_time = None
+	for repeat in range(repeats):
+		start_time = time.perf_counter()
+		function()
+		call_time = time.perf_counter() - start_time
+		best_time = call_time if best_time is None else min(best_time, call_time)
+	return best_time
+
+def measure_peak_memory(function):
+	"""
+	Returns the peak of the memory allocated during a call to function
+	in bytes, as traced by tracemalloc, numpy arrays included
+	The call is separate from the timed ones since tracing slows it
+	"""
+	tracemalloc.start()
+	try:
+		function()
+		current_memory, peak_memory = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return peak_memory
+
+def record_result(results, name, rows_amount, seconds, peak_memory = None, **details):
+	"""
+	Prints a result and appends it to results
+	details - more values of the result, like the grid size
+	"""
+	row = BENCHMARK_OUTPUT_FORMAT.format(name, rows_amount, seconds, rows_amount / seconds,
+										 seconds / rows_amount * 1e9)
+	if peak_memory is not None:
+		row += MEMORY_OUTPUT_FORMAT.format(peak_memory / 2 ** 20)
+	print(row)
+	result = {'name': name, 'rows': rows_amount, 'seconds': seconds,
+			  'rows_per_second': rows_amount / seconds, 'peak_memory': peak_memory}
+	result.update(details)
+	results.append(result)
+
+def benchmark_parse(options, results):
+	"""
+	Times InputParser.start on column files of growing size,
+	with a leading empty row for every data row as the worst case
+	for removing the empty rows.
+	A constant ns/row shows the parse time is linear in the file size
+	"""
+	for rows_amount in options['rows']:
+		for leading_empty_rows in (0, rows_amount):
+			file_path = write_temporary_input(create_column_input_text(rows_amount, leading_empty_rows))
+			try:
+				seconds = time_call(lambda: InputParser(file_path = file_path).start(), options['repeats'])
+			finally:
+				os.remove(file_path)
+			record_result(results, 'parse' if leading_empty_rows == 0 else 'parse_empty',
+						  rows_amount, seconds)
+
+def benchmark_model(options, results):
+	"""
+	Times evaluating the linear function on rows_amount points,
+	by np.vectorize over a python function against LinearModel
+	which is evaluated natively on the whole array
+	"""
+	linear_model = LinearModel()
+	linear_function = lambda x: 2.0 * x + 1.0
+	for rows_amount in options['rows']:
+		x_values = np.linspace(0, 1, rows_amount)
+		seconds = time_call(lambda: np.vectorize(linear_function)(x_values), options['repeats'])
+		record_result(results, 'vectorize', rows_amount, seconds)
+		seconds = time_call(lambda: linear_model.evaluate(x_values, (2.0, 1.0)), options['repeats'])
+		record_result(results, 'model', rows_amount, seconds)
+
+def time_first_result(arguments, working_directory):
+	"""
+	Runs main.py with arguments in a new interpreter
+	returns the wall times until it prints its first non empty row
+	and until it exits
+	"""
+	# Unbuffered, so the first row arrives when it is printed
+	environment = dict(os.environ, PYTHONUNBUFFERED = '1')
+	start_time = time.perf_counter()
+	process = subprocess.Popen([sys.executable, os.path.abspath('main.py')] + arguments,
+							   stdout = subprocess.PIPE, universal_newlines = True,
+							   cwd = working_directory, env = environment)
+	first_result_time = None
+	for row in process.stdout:
+		if first_result_time is None and len(row.strip()) != 0:
+			first_result_time = time.perf_counter() - start_time
+	process.wait()
+	return first_result_time, time.perf_counter() - start_time
+
+def benchmark_startup(options, results):
+	"""
+	Times a new interpreter importing main, and running main.py
+	on column files of growing size until it prints the fit
+	and until it exits, with and without plotting
+	"""
+	repeats = options['repeats']
+	seconds = time_call(lambda: subprocess.check_call([sys.executable, '-c', 'import main']), repeats)
+	print(STARTUP_OUTPUT_FORMAT.format('import', '', seconds))
+	results.append({'name': 'import', 'seconds': seconds})
+	with tempfile.TemporaryDirectory() as working_directory:
+		for rows_amount in options['rows']:
+			file_path = write_temporary_input(create_column_input_text(rows_amount))
+			try:
+				for name, arguments in (('no_plot', ['-f', file_path, '--no_plot']),
+										('plot', ['-f', file_path])):
+					first_result_times, exit_times = zip(*[time_first_result(arguments, working_directory) \
+														   for repeat in range(repeats)])
+					for stage_name, seconds in ((name + '_first', min(first_result_times)),
+												(name + '_exit', min(exit_times))):
+						print(STARTUP_OUTPUT_FORMAT.format(stage_name, rows_amount, seconds))
+						results.append({'name': stage_name, 'rows': rows_amount, 'seconds': seconds})
+			finally:
+				os.remove(file_path)
+
+def benchmark_stages(options, results):
+	"""
+	Times every stage of a fit on its own, for both input formats
+	parse - InputParser.start
+	fit - the linear fit and its chi, without the cached weighted sums
+	grid - the full (a, b) grid search of every grid size,
+		   its throughput is in data points times grid cells per second
+	plot - plotting the fit to a file
+	"""
+	repeats = options['repeats']
+	with tempfile.TemporaryDirectory() as working_directory:
+		for input_format in options['formats']:
+			for rows_amount in options['rows']:
+				file_path = write_temporary_input(INPUT_TEXT_CREATORS[input_format](rows_amount))
+				try:
+					parse = lambda: InputParser(file_path = file_path).start()
+					record_result(results, input_format + '_parse', rows_amount, time_call(parse, repeats),
+								  measure_peak_memory(parse), format = input_format, stage = 'parse')
+					linear_calc = FitLinearCalculator(parse())
+				finally:
+					os.remove(file_path)
+
+				def fit():
+					linear_calc.input.weighted_sums = None
+					linear_calc.calculate()
+				record_result(results, input_format + '_fit', rows_amount, time_call(fit, repeats),
+							  measure_peak_memory(fit), format = input_format, stage = 'fit')
+
+				for grid_size in options['grid']:
+					benchmark_grid(linear_calc, grid_size, repeats, results, input_format)
+
+				plot_name = os.path.join(working_directory, 'plot')
+				plot = lambda: linear_calc.plot(save_plot_name = plot_name)
+				record_result(results, input_format + '_plot', rows_amount, time_call(plot, repeats),
+							  measure_peak_memory(plot), format = input_format, stage = 'plot')
+
+def benchmark_grid(linear_calc, grid_size, repeats, results, input_format):
+	"""
+	Times the full grid search of grid_size a values and
+	grid_size b values around the linear fit's values
+	"""
+	linear_calc.calculate()
+	calc_input = linear_calc.input
+	calc_input.a_step_size = 4 * linear_calc.a_uncertainty / grid_size
+	calc_input.b_step_size = 4 * linear_calc.b_uncertainty / grid_size
+	calc_input.a_values = linear_calc.a_value + calc_input.a_step_size * \
+						  (np.arange(grid_size) - grid_size // 2)
+	calc_input.b_values = linear_calc.b_value + calc_input.b_step_size * \
+						  (np.arange(grid_size) - grid_size // 2)
+	grid = lambda: linear_calc.chose_best_a_b_values()
+	seconds = time_call(grid, repeats)
+	rows_amount = len(calc_input.x_values)
+	record_result(results, input_format + '_grid', rows_amount, seconds, measure_peak_memory(grid),
+				  format = input_format, stage = 'grid', grid_size = grid_size,
+				  cells_per_second = grid_size ** 2 / seconds,
+				  points_cells_per_second = rows_amount * grid_size ** 2 / seconds)
+
+def benchmark_bootstrap(options, results):
+	"""
+	Times the bootstrap of config.BOOTSTRAP_REPLICAS data sets
+	of every amount of data points, its throughput is in
+	data points times data sets per second
+	"""
+	for rows_amount in options['rows']:
+		file_path = write_temporary_input(create_column_input_text(rows_amount))
+		try:
+			calc_input = InputParser(file_path = file_path).start()
+		finally:
+			os.remove(file_path)
+		bootstrap = lambda: BootstrapEstimator(calc_input, seed = 0).calculate()
+		seconds = time_call(bootstrap, options['repeats'])
+		record_result(results, 'bootstrap', rows_amount, seconds, measure_peak_memory(bootstrap),
+					  stage = 'bootstrap', replicas = config.BOOTSTRAP_REPLICAS,
+					  points_replicas_per_second = rows_amount * config.BOOTSTRAP_REPLICAS / seconds)
+
+def calculate_reference_a_b_values(x_values, y_values, y_uncertainties):
+	"""
+	Calculates the linear fit's a and b values with a separate pass
+	for the means and for the centered sums, in long double floats
+	"""
+	x_values, y_values = x_values.astype(np.longdouble), y_values.astype(np.longdouble)
+	weights = 1 / np.square(y_uncertainties.astype(np.longdouble))
+	x_mean = np.sum(weights * x_values) / np.sum(weights)
+	y_mean = np.sum(weights * y_values) / np.sum(weights)
+	a_value = np.sum(weights * (x_values - x_mean) * (y_values - y_mean)) / \
+			  np.sum(weights * np.square(x_values - x_mean))
+	return a_value, y_mean - a_value * x_mean
+
+def benchmark_sums(options, results):
+	"""
+	Compares the raw and the centered (stable) weighted sums of the
+	linear fit, on data of growing size and of growing x offsets
+	the errors are relative to calculate_reference_a_b_values of the data
+	moved back to 0, which is exact since the offsets are integers
+	"""
+	for rows_amount in options['rows']:
+		x_values, y_values = create_data_values(rows_amount)
+		y_uncertainties = np.full(rows_amount, 0.1)
+		for offset in SUMS_OFFSETS:
+			shifted_x_values = x_values + offset
+			a_value, b_value = calculate_reference_a_b_values(shifted_x_values - offset, y_values,
+															  y_uncertainties)
+			for name, stable in (('sums_raw', False), ('sums_stable', True)):
+				sums = lambda: create_weighted_sums(shifted_x_values, y_values, y_uncertainties, stable = stable)
+				seconds = time_call(sums, options['repeats'])
+				fit_a_value, fit_a_uncertainty, fit_b_value, fit_b_uncertainty = \
+					sums().calculate_linear_a_b_values()
+				# The fit's b is at x = -offset, moved back to x = 0
+				a_error = float(abs(fit_a_value - a_value) / abs(a_value))
+				b_error = float(abs(fit_b_value + fit_a_value * offset - b_value) / abs(b_value))
+				record_result(results, name, rows_amount, seconds, stage = 'sums', offset = offset,
+							  a_relative_error = a_error, b_relative_error = b_error)
+				print(SUMS_ERROR_FORMAT.format(name, rows_amount, offset, a_error, b_error))
+
+BENCHMARKS = {'parse': benchmark_parse,
+			  'model': benchmark_model,
+			  'startup': benchmark_startup,
+			  'stages': benchmark_stages,
+			  'bootstrap': benchmark_bootstrap,
+			  'sums': benchmark_sums}
+
+def find_git_commit():
+	"""
+	Returns the checked out git commit and if the tree has changes,
+	none if this is not a git repository
+	"""
+	try:
+		commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], universal_newlines = True,
+										 stderr = subprocess.DEVNULL).strip()
+		status = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+										 universal_newlines = True, stderr = subprocess.DEVNULL)
+	except (OSError, subprocess.CalledProcessError) as e:
+		return None, None
+	return commit, len(status.strip()) != 0
+
+def write_results(output_path, options, results):
+	"""
+	Writes the results as json with the commit and environment
+	they were measured on, so runs can be compared across commits
+	"""
+	commit, dirty = find_git_commit()
+	report = {'commit': commit,
+			  'dirty': dirty,
+			  'date': datetime.datetime.now().isoformat(),
+			  'python': platform.python_version(),
+			  'numpy': np.__version__,
+			  'machine': platform.machine(),
+			  'cpus': os.cpu_count(),
+			  'options': options,
+			  'results': results}
+	with open(output_path, 'w') as f:
+		json.dump(report, f, indent = 1)
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Benchmarks the fit stages')
+	parser.add_argument('benchmarks', help='benchmarks to run', nargs='*',
+						choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+	parser.add_argument('-r','--rows', help='amounts of data rows', type=int, nargs='+',
+						default=PARSE_ROWS_AMOUNTS)
+	parser.add_argument('-g','--grid', help='amounts of a and of b values of the grid stage',
+						type=int, nargs='+', default=GRID_SIZES)
+	parser.add_argument('-f','--formats', help='input formats of the stages benchmark', nargs='+',
+						choices=INPUT_FORMATS, default=INPUT_FORMATS)
+	parser.add_argument('-o','--output', help='json results path')
+	parser.add_argument('--repeats', help='amount of repeats, the best is reported', type=int,
+						default=3)
+	args = vars(parser.parse_args())
+	return args
+
+if __name__ == '__main__':
+	args_dict = parse_args()
+	results = []
+	for benchmark_name in args_dict['benchmarks']:
+		BENCHMARKS[benchmark_name](args_dict, results)
+	if args_dict['output']:
+		write_results(args_dict['output'], args_dict, results)
@@ -0,0 +1,121 @@
+import struct
+import config
+import zipfile
+import argparse
+import traceback
+import numpy as np
+from lab_fit_exception import LabFitException
+
+# The size of a zip local file header before its name and extra fields
+ZIP_LOCAL_HEADER_SIZE = 30
+ZIP_LOCAL_HEADER_FORMAT = '<HH'
+ZIP_LOCAL_HEADER_LENGTHS_OFFSET = 26
+
+BINARY_KEYS = [config.BINARY_DATA_KEY, config.BINARY_X_AXIS_KEY, config.BINARY_Y_AXIS_KEY,
+			   config.BINARY_A_RANGE_KEY, config.BINARY_B_RANGE_KEY]
+
+def save_binary_input(file_path, calc_input):
+	"""
+	Saves calc_input as a binary input file
+	the data is the input's (N, 4) x, dx, y, dy data buffer, kept column
+	major so the mapped columns are contiguous, with the
+	axis titles and the a and b (start, end, step) ranges as metadata
+	The npz is not compressed so its data can be memory mapped
+	"""
+	binary_input = {config.BINARY_DATA_KEY: np.asfortranarray(calc_input.data),
+					config.BINARY_X_AXIS_KEY: np.array(calc_input.x_axis_title),
+					config.BINARY_Y_AXIS_KEY: np.array(calc_input.y_axis_title),
+					config.BINARY_A_RANGE_KEY: create_range(calc_input.a_values,
+															calc_input.a_step_size),
+					config.BINARY_B_RANGE_KEY: create_range(calc_input.b_values,
+															calc_input.b_step_size)}
+	with open(file_path, 'wb') as f:
+		np.savez(f, **binary_input)
+
+def create_range(values, step_size):
+	"""
+	Creates the (start, end, step) range of values expanded by the parser
+	returns an empty array if there are no values
+	"""
+	if values is None or step_size is None:
+		return np.empty(0)
+	return np.array([values[0], values[-1], step_size], dtype = np.float64)
+
+def load_binary_input(file_path):
+	"""
+	Loads a binary input file saved by save_binary_input
+	returns a dictionary of config.BINARY_*_KEY to values,
+	the data is a read only memory map of the file, not a copy
+	"""
+	binary_input = {}
+	with np.load(file_path, mmap_mode = 'r') as npz_file:
+		for key in BINARY_KEYS:
+			if key not in npz_file:
+				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+													   config.INVALID_BINARY_FILE.format(key)))
+			# np.load does not memory map npz members, so the data is mapped by hand
+			if key != config.BINARY_DATA_KEY:
+				binary_input[key] = npz_file[key]
+
+	binary_input[config.BINARY_X_AXIS_KEY] = str(binary_input[config.BINARY_X_AXIS_KEY])
+	binary_input[config.BINARY_Y_AXIS_KEY] = str(binary_input[config.BINARY_Y_AXIS_KEY])
+	binary_input[config.BINARY_DATA_KEY] = memory_map_member(file_path, config.BINARY_DATA_KEY)
+	return binary_input
+
+def memory_map_member(file_path, key):
+	"""
+	Memory maps the array of key inside an uncompressed npz file
+	falls back to reading the array if it can not be mapped
+	"""
+	member_name = key + '.npy'
+	with zipfile.ZipFile(file_path) as archive:
+		member_info = archive.getinfo(member_name)
+
+	if member_info.compress_type != zipfile.ZIP_STORED:
+		with np.load(file_path) as npz_file:
+			return npz_file[key]
+
+	with open(file_path, 'rb') as f:
+		# The member's data starts after its local header, name and extra field
+		f.seek(member_info.header_offset + ZIP_LOCAL_HEADER_LENGTHS_OFFSET)
+		name_length, extra_length = struct.unpack(ZIP_LOCAL_HEADER_FORMAT, f.read(4))
+		f.seek(member_info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length)
+		version = np.lib.format.read_magic(f)
+		if version == (1, 0):
+			shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+		else:
+			shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+		array_offset = f.tell()
+
+	return np.memmap(file_path, dtype = dtype, mode = 'r', shape = shape,
+					 order = 'F' if fortran_order else 'C', offset = array_offset)
+
+def convert_text_input(input_path, output_path):
+	"""
+	Converts a text (column or row type) input file to a binary input file
+	"""
+	# Imported here since the parser itself reads binary input files
+	from streaming_input_parser import create_input_parser
+	input_parser = create_input_parser(input_path, contains_ab_values = True)
+	save_binary_input(output_path, input_parser.start())
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Converts a text input file to a binary input file')
+	parser.add_argument('-f','--file_path', help='text data file path', required=True)
+	parser.add_argument('-o','--output', help='binary data file path, ' + config.BINARY_FILE_EXTENSION,
+						required=True)
+	args = vars(parser.parse_args())
+	return args
+
+def main(input_path, output_path):
+	try:
+		convert_text_input(input_path, output_path)
+	except LabFitException as e:
+		print(e.message)
+	except Exception as e:
+		print("{0}:".format(config.UNKNOWN_ERROR))
+		traceback.print_exc()
+
+if __name__ == '__main__':
+	args_dict = parse_args()
+	main(args_dict['file_path'], args_dict['output'])
@@ -0,0 +1,148 @@
+import config
+import numpy as np
+import parallel_executor
+from weighted_sums import create_replica_weighted_sums
+
+# The data of a worker process, set once by init_bootstrap_worker
+worker_data = None
+
+def fit_replicas(data, seed_sequence, replicas_amount):
+	"""
+	Draws replicas_amount synthetic data sets, every x and y value
+	moved by a normal error of its uncertainty, and fits all of them
+	together with the batched weighted sums, see WeightedSums.add_replica_arrays
+	data - the x, dx, y, dy arrays, the uncertainties to weight with
+		   and if the centered sums are used, see create_weighted_sums
+	seed_sequence - the numpy SeedSequence of the drawn errors
+	returns the a values and b values of the data sets
+	"""
+	x_values, x_uncertainties, y_values, y_uncertainties, weight_uncertainties, stable = data
+	random_generator = np.random.default_rng(seed_sequence)
+	shape = (replicas_amount, len(x_values))
+	# The errors are drawn straight into the data sets arrays
+	x_samples = random_generator.standard_normal(shape)
+	x_samples *= x_uncertainties
+	x_samples += x_values
+	y_samples = random_generator.standard_normal(shape)
+	y_samples *= y_uncertainties
+	y_samples += y_values
+
+	weighted_sums = create_replica_weighted_sums(x_samples, y_samples, weight_uncertainties,
+												 stable = stable)
+	a_values, a_uncertainties, b_values, b_uncertainties = weighted_sums.calculate_linear_a_b_values()
+	return a_values, b_values
+
+def init_bootstrap_worker(data):
+	"""
+	Stores the worker's data once, instead of sending it with every chunk
+	"""
+	global worker_data
+	worker_data = data
+
+def fit_replicas_of_worker(chunk):
+	"""
+	Fits a chunk of replicas of the worker's data
+	chunk - the chunk's SeedSequence and amount of replicas
+	"""
+	seed_sequence, replicas_amount = chunk
+	return fit_replicas(worker_data, seed_sequence, replicas_amount)
+
+class BootstrapEstimator(object):
+	"""
+	Estimates the distribution of the linear fit's a and b values
+	by fitting many synthetic data sets, drawn by the data's uncertainties
+	The data sets are drawn and fitted in chunks which fit memory_budget
+	bytes, every chunk has its own seed derived from seed, so the result
+	depends only on the seed and not on the amount of workers
+	"""
+	def __init__(self, input_obj, replicas_amount = config.BOOTSTRAP_REPLICAS, seed = None,
+				 weight_uncertainties = None, memory_budget = config.BOOTSTRAP_MEMORY_BUDGET,
+				 workers = config.DEFAULT_WORKERS):
+		super(BootstrapEstimator, self).__init__()
+		self.input = input_obj
+		self.replicas_amount = replicas_amount
+		self.seed = seed
+		# The uncertainties the data sets are weighted with, if none the y uncertainties
+		self.weight_uncertainties = weight_uncertainties if weight_uncertainties is not None \
+															else input_obj.y_uncertainties
+		self.memory_budget = memory_budget
+		self.workers = workers
+		self.a_values = None
+		self.b_values = None
+
+	def calculate_chunk_replicas(self):
+		"""
+		Calculates the amount of replicas of a chunk, so the chunk's
+		config.BOOTSTRAP_TEMPORARY_ARRAYS data sets sized arrays fit the memory budget
+		"""
+		replica_bytes = len(self.input.x_values) * np.dtype(np.float64).itemsize * \
+						config.BOOTSTRAP_TEMPORARY_ARRAYS
+		return int(max(1, min(self.replicas_amount, self.memory_budget // replica_bytes)))
+
+	def create_chunks(self):
+		"""
+		Creates the (SeedSequence, replicas amount) of every chunk
+		"""
+		chunk_replicas = self.calculate_chunk_replicas()
+		chunk_sizes = [chunk_replicas] * (self.replicas_amount // chunk_replicas)
+		if self.replicas_amount % chunk_replicas != 0:
+			chunk_sizes.append(self.replicas_amount % chunk_replicas)
+		seed_sequences = np.random.SeedSequence(self.seed).spawn(len(chunk_sizes))
+		return list(zip(seed_sequences, chunk_sizes))
+
+	def calculate(self):
+		"""
+		Fits all the replicas, stores their a and b values
+		at self.a_values and self.b_values
+		"""
+		data = (self.input.x_values, self.input.x_uncertainties, self.input.y_values,
+				self.input.y_uncertainties, self.weight_uncertainties, self.input.stable_sums)
+		chunks = self.create_chunks()
+		if self.workers > 1:
+			chunk_results = list(parallel_executor.map_in_order(fit_replicas_of_worker, chunks, self.workers,
+																initializer = init_bootstrap_worker,
+																initargs = (data,)))
+		else:
+			chunk_results = [fit_replicas(data, seed_sequence, replicas_amount) \
+							 for seed_sequence, replicas_amount in chunks]
+
+		self.a_values = np.concatenate([a_values for a_values, b_values in chunk_results])
+		self.b_values = np.concatenate([b_values for a_values, b_values in chunk_results])
+
+	def calculate_covariance(self):
+		"""
+		Calculates the 2x2 covariance matrix of the a and b values
+		"""
+		return np.cov(self.a_values, self.b_values)
+
+	def calculate_interval(self, values, confidence = config.BOOTSTRAP_CONFIDENCE):
+		"""
+		Calculates the central interval of values holding confidence of them
+		returns the low and high ends
+		"""
+		tail = (1 - confidence) / 2
+		low_value, high_value = np.quantile(values, [tail, 1 - tail])
+		return low_value, high_value
+
+	def create_output_dict(self):
+		"""
+		Creates a dictionary of the distributions' values,
+		the keys are the config.BOOTSTRAP_*_KEY names
+		"""
+		covariance = self.calculate_covariance()
+		a_low, a_high = self.calculate_interval(self.a_values)
+		b_low, b_high = self.calculate_interval(self.b_values)
+		return {config.BOOTSTRAP_REPLICAS_KEY: len(self.a_values),
+				config.BOOTSTRAP_A_MEAN_KEY: np.mean(self.a_values),
+				config.BOOTSTRAP_A_STD_KEY: np.sqrt(covariance[0, 0]),
+				config.BOOTSTRAP_A_LOW_KEY: a_low,
+				config.BOOTSTRAP_A_HIGH_KEY: a_high,
+				config.BOOTSTRAP_B_MEAN_KEY: np.mean(self.b_values),
+				config.BOOTSTRAP_B_STD_KEY: np.sqrt(covariance[1, 1]),
+				config.BOOTSTRAP_B_LOW_KEY: b_low,
+				config.BOOTSTRAP_B_HIGH_KEY: b_high,
+				config.BOOTSTRAP_COVARIANCE_KEY: covariance[0, 1]}
+
+	def print_output(self):
+		output_dict = self.create_output_dict()
+		print(config.BOOTSTRAP_OUTPUT_FORMAT.format(*[output_dict[key] for key in config.BOOTSTRAP_KEYS]))
@@ -1,64 +1,155 @@
 import config
 import utils
 import numpy as np
-from matplotlib import pyplot
 from lab_fit_exception import LabFitException
+from weighted_sums import create_weighted_sums
+
+def create_data_buffer(rows_amount, dtype = config.DEFAULT_DATA_DTYPE):
+	"""
+	Creates an empty (rows_amount, 4) data buffer of the x, dx, y, dy
+	columns at config.DATA_*_INDEX
+	The buffer is column major, so every column is a contiguous view
+	and the fits, which work on whole columns, read it sequentially
+	"""
+	return np.empty((rows_amount, config.MAX_DATA_TYPE_AMOUNT), dtype = dtype, order = 'F')
 
 class CalcInput(object):
-	"""Holds all the information from the input file"""
+	"""
+	Holds all the information from the input file
+	the data is a single (N, 4) buffer, see create_data_buffer,
+	x_values, x_uncertainties, y_values and y_uncertainties are its columns,
+	always float64 so a float32 buffer only saves the stored data's memory
+	"""
+	__slots__ = ('data', 'x_axis_title', 'y_axis_title', 'a_values', 'b_values',
+				 'a_step_size', 'b_step_size', 'model_name', 'model_degree',
+				 'weighted_sums', 'stable_sums', 'contains_ab_values')
+
 	def __init__(self, x_values = None, x_uncertainties = None,
 				 y_values = None, y_uncertainties = None,
 				 a_values = None, b_values = None,
 				 a_step_size = None, b_step_size = None,
-				 x_axis_title = config.X_AXIS_DEFAULT, 
-				 y_axis_title = config.Y_AXIS_DEFAULT):
+				 x_axis_title = config.X_AXIS_DEFAULT,
+				 y_axis_title = config.Y_AXIS_DEFAULT,
+				 model_name = None, model_degree = None,
+				 dtype = config.DEFAULT_DATA_DTYPE):
 		super(CalcInput, self).__init__()
-		self.x_values = x_values if x_values != None else [] 
-		self.x_uncertainties = x_uncertainties if x_uncertainties != None \
-												else []
-		self.y_values = y_values if y_values != None else []
-		self.y_uncertainties = y_uncertainties if y_uncertainties != None \
-												else []
+		self.weighted_sums = None
+		self.stable_sums = False
+		self.data = create_data_buffer(0, dtype)
+		if x_values is not None:
+			self.set_columns(x_values, x_uncertainties, y_values, y_uncertainties, dtype)
 		self.x_axis_title = x_axis_title
 		self.y_axis_title = y_axis_title
 		self.a_values = a_values
 		self.b_values = b_values
 		self.a_step_size = a_step_size
 		self.b_step_size = b_step_size
+		# The model chosen by the input file, if any
+		self.model_name = model_name
+		self.model_degree = model_degree
 		if type(self.a_values) != type(None) and self.a_values.all() \
 		   and type(self.b_values) != type(None) and self.b_values.all():
 			self.contains_ab_values = True
 		else:
 			self.contains_ab_values = False
 
+	@property
+	def x_values(self):
+		return self.get_column(config.DATA_X_INDEX)
+
+	@property
+	def x_uncertainties(self):
+		return self.get_column(config.DATA_X_UNCERTAINTY_INDEX)
+
+	@property
+	def y_values(self):
+		return self.get_column(config.DATA_Y_INDEX)
+
+	@property
+	def y_uncertainties(self):
+		return self.get_column(config.DATA_Y_UNCERTAINTY_INDEX)
+
+	def get_column(self, index):
+		"""
+		Returns the data column at index as float64, a view of the buffer
+		or, if the buffer is stored as float32, a float64 copy of the column
+		so the sums and the chi values are calculated in float64
+		"""
+		return self.data[:, index].astype(np.float64, copy = False)
+
+	def set_data(self, data):
+		"""
+		Sets the data buffer, an (N, 4) array of the columns at
+		config.DATA_*_INDEX, it is used as is without copying
+		"""
+		if np.ndim(data) != 2 or np.shape(data)[1] != config.MAX_DATA_TYPE_AMOUNT:
+			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+												   config.DIFFERENT_DATA_AMOUNTS))
+		self.data = data
+		self.weighted_sums = None
+
+	def set_columns(self, x_values, x_uncertainties, y_values, y_uncertainties,
+					dtype = config.DEFAULT_DATA_DTYPE):
+		"""
+		Copies the data columns into a new data buffer of dtype
+		"""
+		columns = (x_values, x_uncertainties, y_values, y_uncertainties)
+		if any(column is None or len(column) != len(x_values) for column in columns):
+			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+												   config.DIFFERENT_DATA_AMOUNTS))
+		data = create_data_buffer(len(x_values), dtype)
+		data[:, config.DATA_X_INDEX] = x_values
+		data[:, config.DATA_X_UNCERTAINTY_INDEX] = x_uncertainties
+		data[:, config.DATA_Y_INDEX] = y_values
+		data[:, config.DATA_Y_UNCERTAINTY_INDEX] = y_uncertainties
+		self.set_data(data)
+
+	def set_stable_sums(self, stable_sums):
+		"""
+		Choses the weighted sums of the fits, if stable_sums is true
+		the centered sums, for data far from 0, see create_weighted_sums
+		"""
+		if stable_sums != self.stable_sums:
+			self.stable_sums = stable_sums
+			self.weighted_sums = None
+
+	def get_weighted_sums(self):
+		"""
+		Returns the WeightedSums of the data, calculated on the first call
+		and reused by every later fit, until the data is set again
+		"""
+		if self.weighted_sums is None:
+			self.weighted_sums = create_weighted_sums(self.x_values, self.y_values,
+													  self.y_uncertainties, stable = self.stable_sums)
+		return self.weighted_sums
+
 	def is_valid(self):
 		"""
 		Checks that the data is valid
-		1. Checks same amount of data in x_values, y_values,
-		   x_uncertainties, y_uncertainties
-		2. Checks all data values are floats
-		3. Checks all uncertainty values are above 0
+		1. Checks there is any data point
+		2. Checks all data values are finite floats
+		3. Checks no uncertainty is negative and every point has one above 0
+		The data is checked in blocks of config.VALIDATION_BLOCK_ROWS rows,
+		so it is read from memory once
 		"""
-		# Checks that there is a unified length between data rows
-		x_values_length = len(self.x_values)
-		if x_values_length != len(self.x_uncertainties) or \
-		   x_values_length != len(self.y_values) or \
-		   x_values_length != len(self.y_uncertainties):
-		   raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
-													   config.DIFFERENT_DATA_AMOUNTS))
+		if len(self.data) == 0:
+			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+												   config.NOT_ENOUGH_DATA_ROWS))
+		if not np.issubdtype(self.data.dtype, np.floating):
+			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+												   config.INVALID_DATA_VALUE))
 
-		if not np.issubdtype(self.x_uncertainties.dtype, np.number) or \
-		   not np.issubdtype(self.x_values.dtype, np.number) or \
-		   not np.issubdtype(self.y_uncertainties.dtype, np.number) or \
-		   not np.issubdtype(self.y_values.dtype, np.number):
-			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
-													   config.INVALID_DATA_VALUE))
- 
-		minimum_uncertainty = min(self.x_uncertainties + self.y_uncertainties)
-		if minimum_uncertainty <= 0:
-			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
+		for block_start in range(0, len(self.data), config.VALIDATION_BLOCK_ROWS):
+			block = self.data[block_start:block_start + config.VALIDATION_BLOCK_ROWS]
+			if not np.isfinite(block).all():
+				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+													   config.NON_FINITE_DATA_VALUE))
+			x_uncertainties = block[:, config.DATA_X_UNCERTAINTY_INDEX]
+			y_uncertainties = block[:, config.DATA_Y_UNCERTAINTY_INDEX]
+			if not np.all((x_uncertainties >= 0) & (y_uncertainties >= 0) & \
+						  (x_uncertainties + y_uncertainties > 0)):
+				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
 													   config.INVALID_UNCERTAINTIES))
- 
 
 	def __str__(self):
 		return "X Values: {0}\n".format(self.x_values) + \
@@ -0,0 +1,219 @@
+import config
+import numpy as np
+from fit_models import LinearModel
+
+class ChiGridCalculator(object):
+	"""
+	Calculates the accurate chi values of a whole (a, b) grid
+	with numpy broadcasting instead of a python loop per grid cell
+	"""
+	def __init__(self, input_obj, memory_budget = config.CHI_GRID_MEMORY_BUDGET):
+		super(ChiGridCalculator, self).__init__()
+		self.input = input_obj
+		self.model = LinearModel()
+		self.memory_budget = memory_budget
+		self.surface_a_values = None
+		self.surface_b_values = None
+		self.cells_evaluated = 0
+
+	def calculate_chi_block(self, a_values, b_values):
+		"""
+		Calculates the accurate chi value of every (a, b) pair
+		a_values - the a values of the block
+		b_values - the b values of the block
+		returns an array shaped (len(a_values), len(b_values))
+		Uses the same operations as FitLinearCalculator.calculate_chi_accurate
+		so every cell is identical to calling it with the same a and b
+		If the block's temporary arrays would not fit self.memory_budget
+		the data points are summed in chunks, which may change the last digits
+		"""
+		a_values = np.asarray(a_values)
+		b_values = np.asarray(b_values)
+		data_amount = len(self.input.data)
+		chunk_amount = max(1, self.calculate_tile_elements() // (len(a_values) * len(b_values)))
+		if chunk_amount >= data_amount:
+			chi_block = self.calculate_chi_chunk(a_values, b_values, self.input.x_values,
+												 self.input.x_uncertainties, self.input.y_values,
+												 self.input.y_uncertainties)
+		else:
+			x_values = self.input.x_values
+			x_uncertainties = self.input.x_uncertainties
+			y_values = self.input.y_values
+			y_uncertainties = self.input.y_uncertainties
+			chi_block = np.zeros((len(a_values), len(b_values)))
+			for chunk_start in range(0, data_amount, chunk_amount):
+				chunk_end = chunk_start + chunk_amount
+				chi_block += self.calculate_chi_chunk(a_values, b_values, x_values[chunk_start:chunk_end],
+													  x_uncertainties[chunk_start:chunk_end],
+													  y_values[chunk_start:chunk_end],
+													  y_uncertainties[chunk_start:chunk_end])
+
+		self.cells_evaluated += chi_block.size
+		return chi_block
+
+	def calculate_chi_chunk(self, a_values, b_values, x_values, x_uncertainties,
+							y_values, y_uncertainties):
+		"""
+		Calculates the accurate chi value of every (a, b) pair
+		over the given data points only
+		"""
+		parameters = (a_values[:, np.newaxis, np.newaxis],
+					  b_values[np.newaxis, :, np.newaxis])
+		chi_top_exp = y_values - self.model.evaluate(x_values, parameters)
+		func_plus_dx = self.model.evaluate(x_values + x_uncertainties, parameters)
+		func_minus_dx = self.model.evaluate(x_values - x_uncertainties, parameters)
+		chi_bottom_exp = func_plus_dx - func_minus_dx
+		chi_bottom_exp = pow(chi_bottom_exp, 2)
+		chi_bottom_exp = pow(pow(y_uncertainties, 2) + chi_bottom_exp, 0.5)
+		return np.sum(pow((chi_top_exp / chi_bottom_exp), 2), axis = 2)
+
+	def calculate_tile_elements(self):
+		"""
+		Calculates the amount of a * b * data point elements
+		whose temporary arrays fit self.memory_budget
+		"""
+		return self.memory_budget // (np.dtype(np.float64).itemsize * \
+									  config.CHI_GRID_TEMPORARY_ARRAYS)
+
+	def calculate_tile_shape(self, a_amount, b_amount):
+		"""
+		Calculates how many a and b values can be evaluated together
+		so the temporary arrays of a tile will fit self.memory_budget
+		above the budget's amount of data points a tile is a single cell,
+		whose data is summed in chunks, see self.calculate_chi_block
+		returns the tile's a amount and b amount
+		"""
+		data_amount = max(1, len(self.input.data))
+		tile_elements = self.calculate_tile_elements()
+		tile_b_amount = max(1, min(b_amount, tile_elements // data_amount))
+		tile_a_amount = max(1, min(a_amount, tile_elements // (tile_b_amount * data_amount)))
+		return tile_a_amount, tile_b_amount
+
+	def find_best_a_b_values(self, a_values, b_values, keep_surface = False,
+							 surface_shape = None):
+		"""
+		Finds the (a, b) pair with the minimal accurate chi value
+		the grid is streamed in tiles which fit self.memory_budget,
+		only a running minimum is kept between tiles
+		if keep_surface is true the whole chi surface is returned as well
+		if surface_shape is a (rows, columns) tuple a downsampled surface
+		of at most that shape is returned instead, its a and b values
+		are stored at self.surface_a_values and self.surface_b_values
+		returns best_a, best_b, best_chi, surface
+		on equal chi values the first pair in (a, b) order is chosen,
+		like a loop over a_values and then over b_values
+		"""
+		best_a_index, best_b_index, best_chi, surface = self.find_best_indexes(a_values, b_values,
+																			   keep_surface = keep_surface,
+																			   surface_shape = surface_shape)
+		return a_values[best_a_index], b_values[best_b_index], best_chi, surface
+
+	def find_best_indexes(self, a_values, b_values, keep_surface = False,
+						  surface_shape = None):
+		"""
+		Same as self.find_best_a_b_values but returns the grid indexes
+		returns best_a_index, best_b_index, best_chi, surface
+		"""
+		a_amount = len(a_values)
+		b_amount = len(b_values)
+		tile_a_amount, tile_b_amount = self.calculate_tile_shape(a_amount, b_amount)
+		a_stride, b_stride = 1, 1
+		if surface_shape:
+			a_stride = -(-a_amount // surface_shape[0])
+			b_stride = -(-b_amount // surface_shape[1])
+		self.surface_a_values = a_values[::a_stride]
+		self.surface_b_values = b_values[::b_stride]
+		surface = None
+		if keep_surface or surface_shape:
+			surface = np.empty((len(self.surface_a_values), len(self.surface_b_values)))
+
+		best_a_index = 0
+		best_b_index = 0
+		best_chi = None
+		for a_start in range(0, a_amount, tile_a_amount):
+			a_end = a_start + tile_a_amount
+			for b_start in range(0, b_amount, tile_b_amount):
+				b_end = b_start + tile_b_amount
+				chi_tile = self.calculate_chi_block(a_values[a_start:a_end], b_values[b_start:b_end])
+				if surface is not None:
+					self.insert_tile_to_surface(surface, chi_tile, a_start, b_start,
+												a_stride, b_stride)
+
+				a_index, b_index = np.unravel_index(np.argmin(chi_tile), chi_tile.shape)
+				tile_chi = chi_tile[a_index, b_index]
+				a_index += a_start
+				b_index += b_start
+				# Equal chi values are resolved by the grid order so the
+				# result does not depend on the tile shape
+				if best_chi is None or tile_chi < best_chi or \
+				   (tile_chi == best_chi and (a_index, b_index) < (best_a_index, best_b_index)):
+					best_chi = tile_chi
+					best_a_index = a_index
+					best_b_index = b_index
+
+		return best_a_index, best_b_index, best_chi, surface
+
+	def find_best_a_b_values_adaptive(self, a_values, b_values,
+									  coarse_amount = config.ADAPTIVE_COARSE_AMOUNT,
+									  zoom_factor = config.ADAPTIVE_ZOOM_FACTOR):
+		"""
+		Finds the (a, b) pair with the minimal accurate chi value
+		with a coarse to fine search instead of evaluating every cell
+		1. Evaluates about coarse_amount values of each axis over the grid
+		2. Zooms the window to the cells whose chi is not above the
+		   minimum's neighbours, padded by one step,
+		   and divides the step by zoom_factor
+		3. Repeats until the step is the grid's own step
+		Relies on the chi being convex around the minimum, which it is
+		for the linear function, so the result is the same cell as a full search
+		The amount of evaluated cells is counted at self.cells_evaluated
+		returns best_a, best_b, best_chi
+		"""
+		a_stride = max(1, -(-len(a_values) // coarse_amount))
+		b_stride = max(1, -(-len(b_values) // coarse_amount))
+		a_start, a_end = 0, len(a_values)
+		b_start, b_end = 0, len(b_values)
+		while True:
+			a_indexes = np.arange(a_start, a_end, a_stride)
+			b_indexes = np.arange(b_start, b_end, b_stride)
+			a_index, b_index, best_chi, surface = self.find_best_indexes(a_values[a_indexes],
+																		 b_values[b_indexes],
+																		 keep_surface = True)
+			if a_stride == 1 and b_stride == 1:
+				break
+
+			# A long and narrow chi valley can hide the fine minimum a few
+			# coarse steps away, so the window keeps every cell that is
+			# not above the highest neighbour of the coarse minimum
+			neighbours = surface[max(0, a_index - 1):a_index + 2, max(0, b_index - 1):b_index + 2]
+			low_cells = surface <= np.max(neighbours)
+			low_a_indexes = a_indexes[np.any(low_cells, axis = 1)]
+			low_b_indexes = b_indexes[np.any(low_cells, axis = 0)]
+			a_start = max(0, low_a_indexes[0] - a_stride + 1)
+			a_end = min(len(a_values), low_a_indexes[-1] + a_stride)
+			b_start = max(0, low_b_indexes[0] - b_stride + 1)
+			b_end = min(len(b_values), low_b_indexes[-1] + b_stride)
+			# Keeps the coarse minimum on the new step so it is evaluated again
+			best_a_index = a_indexes[a_index]
+			best_b_index = b_indexes[b_index]
+			a_stride = max(1, a_stride // zoom_factor)
+			b_stride = max(1, b_stride // zoom_factor)
+			a_start += (best_a_index - a_start) % a_stride
+			b_start += (best_b_index - b_start) % b_stride
+
+		return a_values[a_indexes[a_index]], b_values[b_indexes[b_index]], best_chi
+
+	def insert_tile_to_surface(self, surface, chi_tile, a_start, b_start, a_stride, b_stride):
+		"""
+		Copies the tile cells which are part of the (downsampled) surface
+		a_start, b_start - the tile's first grid indexes
+		a_stride, b_stride - the surface's step between grid indexes
+		"""
+		# The first tile index which lies on the surface's stride
+		a_offset = -a_start % a_stride
+		b_offset = -b_start % b_stride
+		sampled_tile = chi_tile[a_offset::a_stride, b_offset::b_stride]
+		surface_a_start = (a_start + a_offset) // a_stride
+		surface_b_start = (b_start + b_offset) // b_stride
+		surface[surface_a_start:surface_a_start + sampled_tile.shape[0],
+				surface_b_start:surface_b_start + sampled_tile.shape[1]] = sampled_tile
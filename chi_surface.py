@@ -0,0 +1,88 @@
+import json
+import config
+import numpy as np
+
+class ChiSurface(object):
+	"""
+	Holds the accurate chi values of a whole (a, b) grid,
+	calculated once by ChiGridCalculator, and derives the profile
+	chi curves and the joint confidence contours from it
+	without any more passes over the data
+	"""
+	def __init__(self, a_values, b_values, surface):
+		super(ChiSurface, self).__init__()
+		self.a_values = np.asarray(a_values)
+		self.b_values = np.asarray(b_values)
+		# Shaped (len(a_values), len(b_values))
+		self.surface = surface
+		self.best_a_index, self.best_b_index = np.unravel_index(np.argmin(surface), surface.shape)
+		self.best_chi = surface[self.best_a_index, self.best_b_index]
+
+	def calculate_profile_a(self):
+		"""
+		Calculates the profile chi of every a value,
+		the minimal chi over all the b values
+		"""
+		return np.min(self.surface, axis = 1)
+
+	def calculate_profile_b(self):
+		"""
+		Calculates the profile chi of every b value,
+		the minimal chi over all the a values
+		"""
+		return np.min(self.surface, axis = 0)
+
+	def calculate_contours(self, delta_chi_levels = config.CONTOUR_DELTA_CHI_LEVELS):
+		"""
+		Extracts the contours where the chi is above the minimum by
+		every one of delta_chi_levels, by marching squares over the grid
+		returns a list of the contours of every level, a contour is
+		an array of (a, b) points, closed if its ends are equal
+		a contour which reaches the grid's edge is left open
+		"""
+		# Imported here, like matplotlib which depends on it
+		import contourpy
+		# contourpy's y axis is the surface's first axis
+		contour_generator = contourpy.contour_generator(x = self.b_values, y = self.a_values,
+														z = self.surface - self.best_chi)
+		return [[line[:, ::-1] for line in contour_generator.lines(delta_chi)] \
+				for delta_chi in delta_chi_levels]
+
+	def create_output_dict(self, delta_chi_levels = config.CONTOUR_DELTA_CHI_LEVELS):
+		"""
+		Creates a json serializable dictionary of the best grid cell,
+		the profile chi curves and the contours of every level
+		"""
+		contours = self.calculate_contours(delta_chi_levels)
+		return {'best_a': float(self.a_values[self.best_a_index]),
+				'best_b': float(self.b_values[self.best_b_index]),
+				'best_chi': float(self.best_chi),
+				'profile_a': {'a': self.a_values.tolist(),
+							  'chi': self.calculate_profile_a().tolist()},
+				'profile_b': {'b': self.b_values.tolist(),
+							  'chi': self.calculate_profile_b().tolist()},
+				'contours': [{'delta_chi': delta_chi,
+							  'lines': [line.tolist() for line in level_contours]} \
+							 for delta_chi, level_contours in zip(delta_chi_levels, contours)]}
+
+	def write_json(self, file_path, delta_chi_levels = config.CONTOUR_DELTA_CHI_LEVELS):
+		"""
+		Writes self.create_output_dict as json to file_path
+		"""
+		with open(file_path, 'w') as f:
+			json.dump(self.create_output_dict(delta_chi_levels), f, indent = 1)
+
+	def plot(self, save_plot_name = None, plot = False, plot_format = config.DEFAULT_PLOT_FORMAT,
+			 delta_chi_levels = config.CONTOUR_DELTA_CHI_LEVELS):
+		"""
+		plots the contours and the profile chi curves
+		if save_plot_name is not None saves plot to current directory
+		with save_plot_name
+		if plot is true shows plot on screen
+		"""
+		import plot_renderer
+		plot_renderer.plot_chi_contours(self.a_values, self.b_values, self.calculate_profile_a(),
+										self.calculate_profile_b(), self.calculate_contours(delta_chi_levels),
+										delta_chi_levels, self.best_a_index, self.best_b_index,
+										save_plot_name = save_plot_name, plot = plot,
+										plot_format = plot_format)
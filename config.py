@@ -10,11 +10,36 @@ X_AXIS_DEFAULT = 'x axis'
 Y_AXIS_DEFAULT = 'y axis'
 A_PLOT_X_LABEL = 'a'
 A_PLOT_Y_LABEL_FORMAT = 'chi2(b = {0})'
+B_PLOT_LABEL = 'b'
+PROFILE_Y_LABEL = 'profile chi2'
+CONTOUR_LABEL_FORMAT = 'delta chi2 = {0}'
 A_VALUES_INPUT_STRING = 'a '
 B_VALUES_INPUT_STRING = 'b '
+# The input file row choosing the model, the model name and an optional degree
+MODEL_INPUT_STRING = 'model:'
 AB_VALUES_START_INDEX = 0
 AB_VALUES_END_INDEX = 1
 AB_VALUES_STEP_INDEX = 2
+# The column of every data type in a data array (binary input)
+DATA_X_INDEX = 0
+DATA_X_UNCERTAINTY_INDEX = 1
+DATA_Y_INDEX = 2
+DATA_Y_UNCERTAINTY_INDEX = 3
+# The data column of x, dx, y, dy in this order
+DATA_INDEXES = (DATA_X_INDEX, DATA_X_UNCERTAINTY_INDEX, DATA_Y_INDEX, DATA_Y_UNCERTAINTY_INDEX)
+# The float types the data can be stored as, float32 halves its memory
+DATA_DTYPES = ['float64', 'float32']
+DEFAULT_DATA_DTYPE = 'float64'
+# The amount of data rows validated together
+VALIDATION_BLOCK_ROWS = 2 ** 14
+# Binary input files are uncompressed numpy npz (zip) files
+BINARY_FILE_MAGIC = b'PK\x03\x04'
+BINARY_FILE_EXTENSION = '.npz'
+BINARY_DATA_KEY = 'data'
+BINARY_X_AXIS_KEY = 'x_axis_title'
+BINARY_Y_AXIS_KEY = 'y_axis_title'
+BINARY_A_RANGE_KEY = 'a_range'
+BINARY_B_RANGE_KEY = 'b_range'
 
 # The output format for the linear fit
 # 0 - a value
@@ -29,8 +54,160 @@ b = {2}+-{3}
 chi2 = {4}
 chi2_reduced = {5}
 """
+# The output format for a model fit
+# 0 - the model's formula
+# 1 - the parameter rows, of MODEL_PARAMETER_OUTPUT_FORMAT
+# 2 - chi2 value
+# 3 - chi2 reduced value
+MODEL_OUTPUT_FORMAT = """
+{0}
+{1}
+chi2 = {2}
+chi2_reduced = {3}
+"""
+MODEL_PARAMETER_OUTPUT_FORMAT = "{0} = {1}+-{2}"
+# The bootstrap's output values, in BOOTSTRAP_OUTPUT_FORMAT's order
+BOOTSTRAP_REPLICAS_KEY = 'replicas'
+BOOTSTRAP_A_MEAN_KEY = 'a_mean'
+BOOTSTRAP_A_STD_KEY = 'a_std'
+BOOTSTRAP_A_LOW_KEY = 'a_low'
+BOOTSTRAP_A_HIGH_KEY = 'a_high'
+BOOTSTRAP_B_MEAN_KEY = 'b_mean'
+BOOTSTRAP_B_STD_KEY = 'b_std'
+BOOTSTRAP_B_LOW_KEY = 'b_low'
+BOOTSTRAP_B_HIGH_KEY = 'b_high'
+BOOTSTRAP_COVARIANCE_KEY = 'ab_covariance'
+BOOTSTRAP_KEYS = [BOOTSTRAP_REPLICAS_KEY, BOOTSTRAP_A_MEAN_KEY, BOOTSTRAP_A_STD_KEY,
+				  BOOTSTRAP_A_LOW_KEY, BOOTSTRAP_A_HIGH_KEY, BOOTSTRAP_B_MEAN_KEY,
+				  BOOTSTRAP_B_STD_KEY, BOOTSTRAP_B_LOW_KEY, BOOTSTRAP_B_HIGH_KEY,
+				  BOOTSTRAP_COVARIANCE_KEY]
+BOOTSTRAP_OUTPUT_FORMAT = """bootstrap replicas = {0}
+bootstrap a = {1}+-{2} [{3}, {4}]
+bootstrap b = {5}+-{6} [{7}, {8}]
+bootstrap cov(a, b) = {9}
+"""
+GRID_CELLS_OUTPUT_FORMAT = "grid cells evaluated = {0}"
+GRID_CROSS_CHECK_FORMAT = """grid a = {0}
+grid b = {1}
+grid chi2 = {2}
+"""
+# The result keys of a fit, also the batch results table columns
+RESULT_FILE_PATH_KEY = 'file_path'
+RESULT_A_KEY = 'a'
+RESULT_A_UNCERTAINTY_KEY = 'da'
+RESULT_B_KEY = 'b'
+RESULT_B_UNCERTAINTY_KEY = 'db'
+RESULT_CHI_KEY = 'chi2'
+RESULT_CHI_REDUCED_KEY = 'chi2_reduced'
+RESULT_STATUS_KEY = 'status'
+RESULT_COLUMNS = [RESULT_FILE_PATH_KEY, RESULT_A_KEY, RESULT_A_UNCERTAINTY_KEY,
+				  RESULT_B_KEY, RESULT_B_UNCERTAINTY_KEY, RESULT_CHI_KEY,
+				  RESULT_CHI_REDUCED_KEY, RESULT_STATUS_KEY]
+RESULT_STATUS_OK = 'ok'
+BATCH_OUTPUT_DEFAULT = 'batch_results.csv'
+BATCH_OUTPUT_FORMAT = "fitted {0} files, {1} failed, results at {2}"
+# Manifest lines starting with it are ignored
+BATCH_MANIFEST_COMMENT = '#'
+# Joins the directories of a plot named after its file's relative path
+BATCH_PLOT_NAME_SEPARATOR = '_'
+# The plot name of files whose names are equal, and their index in the batch
+BATCH_PLOT_INDEX_FORMAT = '{0}_{1}'
+# The keys of the fit service's json requests and responses
+SERVICE_ID_KEY = 'id'
+SERVICE_DATA_KEY = 'data'
+SERVICE_FILE_PATH_KEY = 'file_path'
+SERVICE_BONUS_KEY = 'bonus'
+SERVICE_ADAPTIVE_KEY = 'adaptive'
+SERVICE_ITERATIVE_KEY = 'iterative'
+SERVICE_MODEL_KEY = 'model'
+SERVICE_DEGREE_KEY = 'degree'
+SERVICE_STATUS_KEY = 'status'
+SERVICE_RESULT_KEY = 'result'
+# The fit service's socket is served only to the local machine
+SERVICE_HOST = '127.0.0.1'
 LINEAR_PLOT_FILE_NAME = "linear_fit"
 A_PLOT_FILE_NAME = "numeric_sampling"
+MODEL_PLOT_FILE_NAME = "model_fit"
+CONTOUR_PLOT_FILE_NAME = "chi_contours"
+CONTOUR_JSON_FILE_NAME = "chi_contours.json"
+# The chi above the minimum of the joint 1 and 2 sigma regions of two parameters
+CONTOUR_DELTA_CHI_LEVELS = [2.30, 6.18]
+# The width and height in inches of the contours plot and its two profiles
+CONTOUR_PLOT_SIZE = (15, 4.8)
+PLOT_FORMATS = ['svg', 'png']
+DEFAULT_PLOT_FORMAT = 'svg'
+# The dots per inch of png plots and of the rasterized parts of svg plots
+PLOT_RASTER_DPI = 150
+# Above this amount of data points the plot shows the points' density
+# and the error bars of only this amount of points
+PLOT_DECIMATION_THRESHOLD = 10 ** 4
+# The amount of density bins of each axis
+PLOT_DENSITY_BINS = 200
+
+# Files from this size in bytes are parsed by the streaming parser
+STREAMING_FILE_SIZE_THRESHOLD = 64 * 2 ** 20
+# The amount of data rows the streaming parser converts together
+STREAMING_CHUNK_ROWS = 2 ** 16
+# The factor the streaming parser's data grows by when it is full
+STREAMING_GROWTH_FACTOR = 1.5
+
+# The memory budget in bytes of a single chi grid tile
+# (a values * b values * data points floats, for every temporary array)
+CHI_GRID_MEMORY_BUDGET = 128 * 2 ** 20
+# The amount of tile sized temporary arrays alive while calculating a tile
+CHI_GRID_TEMPORARY_ARRAYS = 6
+# The amount of values of each axis in the adaptive search's coarse pass
+ADAPTIVE_COARSE_AMOUNT = 16
+# The factor the adaptive search divides its step by in every pass
+ADAPTIVE_ZOOM_FACTOR = 4
+# The amount of tasks submitted to the worker processes for each worker
+PARALLEL_TASKS_PER_WORKER = 4
+# The amount of a ranges a parallel grid search is split to for each worker
+PARALLEL_GRID_RANGES_PER_WORKER = 4
+DEFAULT_WORKERS = 1
+# The amount of removed points after which the online fitter
+# recalculates its sums from its window, to drop rounding errors
+ONLINE_REFRESH_INTERVAL = 10000
+# The x uncertainties are negligible when (2 * a * dx)^2 / dy^2 is below it
+NEGLIGIBLE_DX_RATIO = 1e-9
+
+# The amount of data rows the centered weighted sums are calculated of together,
+# small enough for the rows to stay in the cpu cache between their passes
+STABLE_SUMS_BLOCK_ROWS = 2 ** 14
+
+# The maximum amount of effective variance fit iterations
+EFFECTIVE_VARIANCE_MAX_ITERATIONS = 100
+# The relative change of a under which the effective variance fit stops
+EFFECTIVE_VARIANCE_TOLERANCE = 1e-12
+# The first secant step of the exact minimum search, in a uncertainties
+EFFECTIVE_VARIANCE_SECANT_STEP = 1e-3
+
+# The directory of the fit result cache, ~ is the user's home directory
+RESULT_CACHE_DIRECTORY = '~/.cache/lab_fit'
+# The size in bytes above which the least recently used results are removed
+RESULT_CACHE_MAX_SIZE = 256 * 2 ** 20
+# The bytes read at once while hashing an input file
+RESULT_CACHE_READ_SIZE = 2 ** 20
+# Part of every key, changed when the results of the same options change
+RESULT_CACHE_VERSION = 2
+RESULT_CACHE_ENTRY_FILE_NAME = 'entry.json'
+
+# The default amount of synthetic data sets of the bootstrap
+BOOTSTRAP_REPLICAS = 10000
+# The memory budget in bytes of a chunk of bootstrap data sets
+BOOTSTRAP_MEMORY_BUDGET = 64 * 2 ** 20
+# The amount of chunk sized arrays alive while fitting a chunk
+BOOTSTRAP_TEMPORARY_ARRAYS = 3
+# The part of the a and b values inside the reported intervals, one sigma
+BOOTSTRAP_CONFIDENCE = 0.6827
+
+# The model fitted when neither the command line nor the input file chose one
+DEFAULT_MODEL_NAME = 'linear'
+DEFAULT_POLYNOMIAL_DEGREE = 2
+# The maximum amount of the iterative model fits' steps
+MODEL_FIT_MAX_ITERATIONS = 100
+# The amount of times a step that raises the chi is halved before the fit stops
+MODEL_FIT_MAX_STEP_HALVINGS = 30
 
 # Error Strings
 INPUT_EXCEPTION_PREFIX = "Input file error:"
@@ -41,4 +218,16 @@ UNKNOWN_FILE_TYPE = "Unknown file type."
 DIFFERENT_DATA_AMOUNTS = "Data lists are not the same length."
 INVALID_UNCERTAINTIES = "Not all uncertainties are positive."
 INVALID_DATA_VALUE = "Data has a non float value."
+NON_FINITE_DATA_VALUE = "Data has a nan or infinite value."
 UNKNOWN_ERROR = "Unkown Error."
+LINE_NUMBER_FORMAT = "(line {0})"
+INVALID_BINARY_FILE = "Binary input file is missing {0}."
+NO_BATCH_FILES = "Batch error: No input files found at {0}."
+INVALID_PLOT_DIRECTORY = "Batch error: Can not create the plot directory {0}."
+BATCH_UNSUPPORTED_MODEL = "Batch error: The {0} model's parameters are not the results table's a and b."
+UNKNOWN_MODEL = "Model error: Unknown model {0}, the models are {1}."
+INVALID_POLYNOMIAL_DEGREE = "Model error: The polynomial's degree {0} is not a positive integer."
+INVALID_MODEL_DATA = "Model error: The {0} model needs positive data values."
+INVALID_MODEL_ROW = "Invalid model row."
+INVALID_SERVICE_REQUEST = "Service error: A request needs {0} or {1}."
+INVALID_SERVICE_JSON = "Service error: A request row is not a json object."
@@ -1,19 +1,28 @@
 import config
 import copy
 import numpy as np
-import matplotlib.pyplot as plt
+from chi_grid_calculator import ChiGridCalculator
+from chi_surface import ChiSurface
+import parallel_executor
+from fit_models import LinearModel
+from weighted_sums import create_weighted_sums
 
 class FitLinearCalculator(object):
 	"""Will calculate all the linear fitted function's parameters"""
 	def __init__(self, input_obj):
 		super(FitLinearCalculator, self).__init__()
 		self.input = input_obj
+		self.model = LinearModel()
 		self.a_value = 0
 		self.a_uncertainty = 0
 		self.b_value = 0
 		self.b_uncertainty = 0
 		self.chi = 0
 		self.chi_reduced = 0
+		self.chi_surface = None
+		self.grid_cells_evaluated = 0
+		# The amount of (a, b) values the chi was calculated of
+		self.chi_evaluations = 0
 
 	def calculate_chi(self, a_value = None, b_value = None):
 		"""
@@ -29,6 +38,7 @@ class FitLinearCalculator(object):
 		chi_expression = chi_top_exp / self.input.y_uncertainties
 		chi = np.sum(np.power(chi_expression, 2))
 		chi_reduced = chi / (len(self.input.x_values) - 2)
+		self.chi_evaluations += 1
 
 		self.chi = chi
 		self.chi_reduced = chi_reduced
@@ -46,70 +56,195 @@ class FitLinearCalculator(object):
 		"""
 		a_value = a_value if a_value != None else self.a_value
 		b_value = b_value if b_value != None else self.b_value
-		linear_func = self.create_linear_function(a_value, b_value)
-		chi_top_exp = self.input.y_values - np.vectorize(linear_func)(self.input.x_values)
-		func_plus_dx = np.vectorize(linear_func)(self.input.x_values + self.input.x_uncertainties)
-		func_minus_dx = np.vectorize(linear_func)(self.input.x_values - self.input.x_uncertainties)
+		parameters = (a_value, b_value)
+		chi_top_exp = self.input.y_values - self.model.evaluate(self.input.x_values, parameters)
+		func_plus_dx = self.model.evaluate(self.input.x_values + self.input.x_uncertainties, parameters)
+		func_minus_dx = self.model.evaluate(self.input.x_values - self.input.x_uncertainties, parameters)
 		chi_bottom_exp = func_plus_dx - func_minus_dx
 		chi_bottom_exp = pow(chi_bottom_exp, 2)
 		chi_bottom_exp = pow(pow(self.input.y_uncertainties,2) + chi_bottom_exp, 0.5)
 		chi = np.sum(pow((chi_top_exp / chi_bottom_exp), 2))
 		chi_reduced = chi / (len(self.input.x_values) - 2)
+		self.chi_evaluations += 1
 		return chi, chi_reduced
 
 
-	def calculate_linear_a_b_values(self):
+	def calculate_linear_a_b_values(self, y_uncertainties = None):
 		"""
 		Calculates the linear fit's a and b values
+		from the weighted sums of the data, see WeightedSums
+		y_uncertainties - the uncertainties to weight with,
+		if none will use the input's cached weighted sums
 		"""
-		mean_xy = self.calculate_weighted_mean(self.input.x_values * \
-											   self.input.y_values)
-		x_mean = self.calculate_weighted_mean(self.input.x_values)
-		y_mean = self.calculate_weighted_mean(self.input.y_values)
-		mean_square_x = self.calculate_weighted_mean(np.power(self.input.x_values, 2))
-		square_x_mean = np.power(x_mean, 2)
+		if y_uncertainties is None:
+			weighted_sums = self.input.get_weighted_sums()
+		else:
+			weighted_sums = create_weighted_sums(self.input.x_values, self.input.y_values,
+												 y_uncertainties, stable = self.input.stable_sums)
 
-		y_uncertainties_power = np.power(self.input.y_uncertainties, 2)
-		mean_square_y_uncertainty = self.calculate_weighted_mean(y_uncertainties_power)
-		self.a_value = (mean_xy - (x_mean * y_mean)) / \
-					   (mean_square_x - square_x_mean)
+		self.a_value, self.a_uncertainty, self.b_value, self.b_uncertainty = \
+			weighted_sums.calculate_linear_a_b_values()
 
-		self.a_uncertainty = mean_square_y_uncertainty / \
-							 (len(self.input.x_values) * (mean_square_x - square_x_mean))
+	def calculate_effective_variance_a_b_values(self,
+												max_iterations = config.EFFECTIVE_VARIANCE_MAX_ITERATIONS,
+												tolerance = config.EFFECTIVE_VARIANCE_TOLERANCE):
+		"""
+		Calculates the a and b values of the accurate chi without a grid
+		1. Effective variance reweighted least squares: the linear fit is
+		   repeated with the uncertainties (dy^2 + (f(x + dx) - f(x - dx))^2)^0.5
+		   of the last a value until the relative change of a is below tolerance
+		2. The effective variance ignores that the uncertainties change with a,
+		   so the exact minimum is found with secant steps on the slope
+		   of chi(a, b(a)), where b(a) is the best b of every a
+		The uncertainties are the linear fit's with the effective uncertainties
+		"""
+		self.calculate_linear_a_b_values()
+		for iteration in range(max_iterations):
+			previous_a_value = self.a_value
+			self.calculate_linear_a_b_values(self.calculate_effective_uncertainties())
+			if abs(self.a_value - previous_a_value) <= tolerance * abs(self.a_value):
+				break
+
+		previous_a_value = self.a_value
+		previous_b_value, previous_slope = self.calculate_chi_profile_slope(previous_a_value)
+		a_value = previous_a_value + self.a_uncertainty * config.EFFECTIVE_VARIANCE_SECANT_STEP
+		for iteration in range(max_iterations):
+			b_value, slope = self.calculate_chi_profile_slope(a_value)
+			if slope == previous_slope or \
+			   abs(a_value - previous_a_value) <= tolerance * abs(a_value):
+				break
+			next_a_value = a_value - slope * (a_value - previous_a_value) / (slope - previous_slope)
+			previous_a_value, previous_slope = a_value, slope
+			a_value = next_a_value
+
+		# Without convergence the last step moves a after its b was calculated,
+		# so b is calculated again with the weights of the final a
+		b_value, slope = self.calculate_chi_profile_slope(a_value)
+		self.a_value = a_value
+		self.b_value = b_value
+		self.chi, self.chi_reduced = self.calculate_chi_accurate()
+
+	def calculate_effective_uncertainties(self, a_value = None):
+		"""
+		Calculates the y uncertainties including the x uncertainties
+		as used by self.calculate_chi_accurate
+		a_value - the a value to use, if none will use self.a_value
+		"""
+		a_value = a_value if a_value is not None else self.a_value
+		dx_contribution = np.power(2 * a_value * self.input.x_uncertainties, 2)
+		return np.power(np.power(self.input.y_uncertainties, 2) + dx_contribution, 0.5)
 
-		self.a_uncertainty = np.power(self.a_uncertainty, 0.5)
-		self.b_value = y_mean - (self.a_value * x_mean)
+	def calculate_chi_profile_slope(self, a_value):
+		"""
+		Calculates the best b value of a_value and the slope of
+		the accurate chi as a function of a, along the best b values
+		returns b_value, slope
+		"""
+		weights = 1 / np.power(self.calculate_effective_uncertainties(a_value), 2)
+		b_value = np.sum(weights * (self.input.y_values - a_value * self.input.x_values)) / \
+				  np.sum(weights)
+		residuals = self.input.y_values - (a_value * self.input.x_values + b_value)
+		# b is optimal so only the a derivative of the residuals and weights remain
+		weights_slope = -8 * a_value * np.power(self.input.x_uncertainties * weights, 2)
+		slope = np.sum(-2 * weights * residuals * self.input.x_values + \
+					   np.power(residuals, 2) * weights_slope)
+		self.chi_evaluations += 1
+		return b_value, slope
+
+	def cross_check_with_grid(self, adaptive = True):
+		"""
+		Searches the input's (a, b) grid for the minimal accurate chi,
+		used to cross check the effective variance a and b values
+		if adaptive is true uses the coarse to fine search
+		returns best_a, best_b, best_chi
+		"""
+		grid_calculator = ChiGridCalculator(self.input)
+		if adaptive:
+			best_a, best_b, best_chi = grid_calculator.find_best_a_b_values_adaptive(self.input.a_values,
+																					 self.input.b_values)
+		else:
+			best_a, best_b, best_chi, surface = grid_calculator.find_best_a_b_values(self.input.a_values,
+																					 self.input.b_values)
+		self.chi_evaluations += grid_calculator.cells_evaluated
+		return best_a, best_b, best_chi
+
+	def chose_best_a_b_values(self, keep_surface = False, surface_shape = None,
+							  memory_budget = config.CHI_GRID_MEMORY_BUDGET,
+							  workers = config.DEFAULT_WORKERS):
+		"""
+		Choses the best a and b values via comparing the chi value
+		the (a, b) grid is streamed with ChiGridCalculator in tiles
+		which fit memory_budget bytes
+		if keep_surface is true stores the chi surface at self.chi_surface
+		if surface_shape is a (rows, columns) tuple stores a downsampled
+		surface instead, see ChiGridCalculator.find_best_a_b_values
+		if workers is above 1 and no surface is needed the grid
+		is split between worker processes, with the same result
+		"""
+		if workers > 1 and not keep_surface and not surface_shape:
+			best_a, best_b, best_chi, cells_evaluated = \
+				parallel_executor.find_best_a_b_values_parallel(self.input, self.input.a_values,
+																self.input.b_values, workers,
+																memory_budget = memory_budget)
+			surface = None
+		else:
+			grid_calculator = ChiGridCalculator(self.input, memory_budget = memory_budget)
+			best_a, best_b, best_chi, surface = grid_calculator.find_best_a_b_values(self.input.a_values,
+																					 self.input.b_values,
+																					 keep_surface = keep_surface,
+																					 surface_shape = surface_shape)
+			cells_evaluated = grid_calculator.cells_evaluated
 
-		self.b_uncertainty = (mean_square_y_uncertainty * mean_square_x) / \
-							 (len(self.input.x_values) * (mean_square_x - square_x_mean))
+		self.a_value = best_a
+		self.b_value = best_b
+		self.a_uncertainty = abs(self.input.a_step_size)
+		self.b_uncertainty = abs(self.input.b_step_size)
+		self.chi = best_chi
+		self.chi_reduced = best_chi / (len(self.input.x_values) - 2)
+		self.chi_surface = surface
+		self.grid_cells_evaluated = cells_evaluated
+		self.chi_evaluations += cells_evaluated
 
-		self.b_uncertainty = np.power(self.b_uncertainty, 0.5)
+	def check_if_full_surface(self):
+		"""
+		Checks if self.chi_surface is of the input's whole (a, b) grid,
+		not downsampled
+		"""
+		return self.chi_surface is not None and \
+			   self.chi_surface.shape == (len(self.input.a_values), len(self.input.b_values))
 
-	def chose_best_a_b_values(self):
+	def create_chi_surface(self):
 		"""
-		Choses the best a and b values via comparing the chi value
+		Creates the ChiSurface of the input's whole (a, b) grid
+		reuses the surface kept by self.chose_best_a_b_values if there is one,
+		otherwise the surface is calculated once and kept at self.chi_surface
+		"""
+		if not self.check_if_full_surface():
+			grid_calculator = ChiGridCalculator(self.input)
+			best_a, best_b, best_chi, self.chi_surface = grid_calculator.find_best_a_b_values(self.input.a_values,
+																							  self.input.b_values,
+																							  keep_surface = True)
+			self.chi_evaluations += grid_calculator.cells_evaluated
+		return ChiSurface(self.input.a_values, self.input.b_values, self.chi_surface)
+
+	def chose_best_a_b_values_adaptive(self):
 		"""
-		best_a = self.input.a_values[0]
-		best_b = self.input.b_values[0]
-		best_chi, best_chi_reduced = self.calculate_chi_accurate(best_a, best_b)
-		test_chi = best_chi
-		for a_value in self.input.a_values:
-			for b_value in self.input.b_values:
-				# Calculates chi and determines if it is better
-				test_chi, test_chi_reduced = self.calculate_chi_accurate(a_value, b_value)
-
-				if best_chi > test_chi:
-					best_chi = test_chi
-					best_chi_reduced = test_chi_reduced
-					best_a = a_value
-					best_b = b_value
+		Choses the best a and b values with a coarse to fine search
+		over the (a, b) grid, see ChiGridCalculator.find_best_a_b_values_adaptive
+		stores the amount of evaluated cells at self.grid_cells_evaluated
+		"""
+		grid_calculator = ChiGridCalculator(self.input)
+		best_a, best_b, best_chi = grid_calculator.find_best_a_b_values_adaptive(self.input.a_values,
+																				 self.input.b_values)
 
 		self.a_value = best_a
 		self.b_value = best_b
 		self.a_uncertainty = abs(self.input.a_step_size)
 		self.b_uncertainty = abs(self.input.b_step_size)
 		self.chi = best_chi
-		self.chi_reduced = best_chi_reduced
+		self.chi_reduced = best_chi / (len(self.input.x_values) - 2)
+		self.grid_cells_evaluated = grid_calculator.cells_evaluated
+		self.chi_evaluations += grid_calculator.cells_evaluated
 
 	def create_a_plot_data_points(self):
 		"""
@@ -117,14 +252,39 @@ class FitLinearCalculator(object):
 		returns the data points as two arrays
 		first array will be the a values
 		second array will be the chi values
+		if the whole chi surface is kept and self.b_value is on the grid
+		the chi values are its column, without evaluating the chi again
 		"""
-		chi_values = []
-		for a_value in self.input.a_values:
-			# Calculates chi and chi reduced
-			chi, chi_reduced = self.calculate_chi_accurate(a_value, self.b_value)
-			chi_values.append(chi)
+		b_indexes = np.flatnonzero(self.input.b_values == self.b_value)
+		if self.check_if_full_surface() and len(b_indexes) != 0:
+			return copy.deepcopy(self.input.a_values), self.chi_surface[:, b_indexes[0]].copy()
+
+		if self.check_if_dx_negligible(self.input.a_values):
+			# Without dx the chi is a quadratic of the centered sums, the raw
+			# sums lose the chi's digits when the data is far from 0, so
+			# unless the input's sums are centered they take a pass over the data
+			weighted_sums = self.input.get_weighted_sums()
+			if not self.input.stable_sums:
+				weighted_sums = create_weighted_sums(self.input.x_values, self.input.y_values,
+													 self.input.y_uncertainties, stable = True)
+			chi_values = weighted_sums.calculate_chi(self.input.a_values, self.b_value)
+		else:
+			grid_calculator = ChiGridCalculator(self.input)
+			chi_values = grid_calculator.calculate_chi_block(self.input.a_values, [self.b_value])[:, 0]
 
-		return copy.deepcopy(self.input.a_values), np.array(chi_values)
+		self.chi_evaluations += len(self.input.a_values)
+		return copy.deepcopy(self.input.a_values), chi_values
+
+	def check_if_dx_negligible(self, a_values):
+		"""
+		Checks if the x uncertainties are negligible in the accurate chi
+		of every a value, (2 * a * dx)^2 compared to dy^2,
+		so the plain chi can be used instead
+		"""
+		max_a_value = np.max(np.abs(a_values))
+		dx_contribution = np.max(np.square(2 * max_a_value * self.input.x_uncertainties) / \
+								 np.square(self.input.y_uncertainties))
+		return dx_contribution <= config.NEGLIGIBLE_DX_RATIO
 
 	def print_output(self):
 		print(config.LINEAR_OUTPUT_FORMAT.format(self.a_value,
@@ -134,65 +294,39 @@ class FitLinearCalculator(object):
 												 self.chi,
 												 self.chi_reduced))
 
-	def plot(self, save_plot_name = None, plot = False):
+	def plot(self, save_plot_name = None, plot = False, plot_format = config.DEFAULT_PLOT_FORMAT):
 		"""
 		plots the data points and linear function created
 		if save_plot_name is not None saves plot to current directory
 		with save_plot_name
 		if plot is true shows plot on screen
+		plot_format - one of config.PLOT_FORMATS
 		"""
-		linear_function = self.create_linear_function()
-		fig = plt.figure()
-		ax = plt.axes()
+		# Imported here so fits without plots never import matplotlib
+		import plot_renderer
 		x = np.linspace(np.min(self.input.x_values), 
 						np.max(self.input.x_values), 1000)
-		plt.errorbar(self.input.x_values, self.input.y_values,
-					 xerr = self.input.x_uncertainties,
-					 yerr = self.input.y_uncertainties, fmt='+',
-					 ecolor='b')
-		# zorder so it will be infront, like in the examples not like the instructions
-		ax.plot(x, np.vectorize(linear_function)(x), color = 'r', zorder=32)
-		plt.xlabel(self.input.x_axis_title)
-		plt.ylabel(self.input.y_axis_title)
-
-		if plot:
-			plt.show()
-
-		if save_plot_name:
-			plt.savefig(save_plot_name + '.svg')
-
-		# Closes figure window so it won't show when another function calls plt.show()
-		# This happens regardless of if plt.show was called in this function
-		plt.close()
+		plot_renderer.plot_fit(self.input, x, self.model.evaluate(x, (self.a_value, self.b_value)),
+							   save_plot_name = save_plot_name, plot = plot, plot_format = plot_format)
 
 	def plot_a_chosing_plot(self, a_values, chi_values, save_plot_name = None, 
-							plot = False):
+							plot = False, plot_format = config.DEFAULT_PLOT_FORMAT):
 		"""
 		plots the chi_values as a function of a_values
 		if save_plot_name is not None saves plot to current directory
 		with save_plot_name
 		if plot is true shows plot on screen
 		"""
-		fig = plt.figure()
-		ax = plt.axes()
-		ax.plot(a_values, chi_values, color = 'b')
-		plt.xlabel(config.A_PLOT_X_LABEL)
+		import plot_renderer
 		# Rounding to counter numpy machine error
-		plt.ylabel(config.A_PLOT_Y_LABEL_FORMAT.format(np.round(self.b_value, np.finfo(np.double).precision - 2)))
-
-		if plot:
-			plt.show()
-
-		if save_plot_name:
-			# bbox_inches so the y label won't be cut out of the svg
-			plt.savefig(save_plot_name + '.svg', bbox_inches='tight')
-
-		# Closes figure window so it won't show when another function calls plt.show()
-		# This happens regardless of if plt.show was called in this function
-		plt.close()
+		y_label = config.A_PLOT_Y_LABEL_FORMAT.format(np.round(self.b_value,
+															   np.finfo(np.double).precision - 2))
+		plot_renderer.plot_a_chosing(a_values, chi_values, y_label,
+									 save_plot_name = save_plot_name, plot = plot,
+									 plot_format = plot_format)
 
 	def create_and_plot_a_chosing_plot(self, save_plot_name = None, 
-									   plot = False):
+									   plot = False, plot_format = config.DEFAULT_PLOT_FORMAT):
 		"""
 		Plots and creates the a chosing plot data points
 		if save_plot_name is not None saves plot to current directory
@@ -200,37 +334,46 @@ class FitLinearCalculator(object):
 		if plot is true shows plot on screen
 		"""
 		a_values, chi_values = self.create_a_plot_data_points()
-		self.plot_a_chosing_plot(a_values, chi_values, save_plot_name = save_plot_name, plot = plot)
+		self.plot_a_chosing_plot(a_values, chi_values, save_plot_name = save_plot_name, plot = plot,
+								 plot_format = plot_format)
 
-	def calculate_weighted_mean(self, data_points):
+	def create_output_dict(self):
 		"""
-		Calculates a weighted mean value
-		the weights are self.y_uncertainties
+		Creates a dictionary of the printed output values,
+		the keys are the config.RESULT_*_KEY names
 		"""
-		square_weights = np.power(self.input.y_uncertainties, 2)
-		square_weights_devided = np.sum(np.power(1 / self.input.y_uncertainties, 2))
-		return np.sum(data_points / square_weights) / square_weights_devided
+		return {config.RESULT_A_KEY: self.a_value,
+				config.RESULT_A_UNCERTAINTY_KEY: self.a_uncertainty,
+				config.RESULT_B_KEY: self.b_value,
+				config.RESULT_B_UNCERTAINTY_KEY: self.b_uncertainty,
+				config.RESULT_CHI_KEY: self.chi,
+				config.RESULT_CHI_REDUCED_KEY: self.chi_reduced}
 
-	def create_linear_function(self, a_value = None, b_value = None):
-		"""
-		Creates the linear function from a and b values
-		a_value - the a value to use, if none will use self.a_value
-		b_value - the b value to use, if none will use self.b_value
-		"""
-		a_value = a_value if a_value != None else self.a_value
-		b_value = b_value if b_value != None else self.b_value
-		def linear_function(x):
-			return a_value * x + b_value
+	def print_grid_cells_evaluated(self):
+		print(config.GRID_CELLS_OUTPUT_FORMAT.format(self.grid_cells_evaluated))
 
-		return linear_function
+	def print_cross_check(self, best_a, best_b, best_chi):
+		print(config.GRID_CROSS_CHECK_FORMAT.format(best_a, best_b, best_chi))
 
-	def calculate(self, chose_ab = False):
+	def calculate(self, chose_ab = False, adaptive = False, iterative = False,
+				  workers = config.DEFAULT_WORKERS, keep_surface = False):
 		"""
 		Calculates and changes object with the resulting
 		a b chi and chi reduced values
+		if adaptive is true the a and b values are chosen
+		with a coarse to fine search instead of the whole grid
+		if iterative is true the accurate chi is minimized with
+		effective variance reweighting instead of a grid
+		workers - the amount of processes of the full grid search
+		if keep_surface is true the full grid search keeps its chi surface,
+		see self.create_chi_surface
 		"""
-		if chose_ab and self.input.contains_ab_values:
-			self.chose_best_a_b_values()
+		if iterative:
+			self.calculate_effective_variance_a_b_values()
+		elif chose_ab and self.input.contains_ab_values and adaptive:
+			self.chose_best_a_b_values_adaptive()
+		elif chose_ab and self.input.contains_ab_values:
+			self.chose_best_a_b_values(keep_surface = keep_surface, workers = workers)
 		else:
 			self.calculate_linear_a_b_values()
 			self.calculate_chi()
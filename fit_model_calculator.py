@@ -0,0 +1,72 @@
+import config
+import numpy as np
+
+class FitModelCalculator(object):
+	"""
+	Will calculate all the fitted parameters of any model of fit_models
+	The linear model's grid searches are at FitLinearCalculator
+	"""
+	def __init__(self, input_obj, model):
+		super(FitModelCalculator, self).__init__()
+		self.input = input_obj
+		self.model = model
+		self.parameters = None
+		self.parameter_uncertainties = None
+		self.chi = 0
+		self.chi_reduced = 0
+
+	def calculate_chi(self, parameters = None):
+		"""
+		Calculates the accurate chi and chi reduced value
+		parameters - the parameters to use, if none will use self.parameters
+		"""
+		parameters = parameters if parameters is not None else self.parameters
+		chi = self.model.calculate_chi(self.input, parameters)
+		chi_reduced = chi / (len(self.input.x_values) - len(parameters))
+		return chi, chi_reduced
+
+	def print_output(self):
+		parameter_rows = [config.MODEL_PARAMETER_OUTPUT_FORMAT.format(name, value, uncertainty) \
+						  for name, value, uncertainty in zip(self.model.get_parameter_names(),
+															  self.parameters,
+															  self.parameter_uncertainties)]
+		print(config.MODEL_OUTPUT_FORMAT.format(self.model.get_formula(), '\n'.join(parameter_rows),
+												self.chi, self.chi_reduced))
+
+	def create_output_dict(self):
+		"""
+		Creates a dictionary of the printed output values,
+		the keys are the parameter names, the parameter names
+		prefixed by d for the uncertainties, and config.RESULT_CHI*_KEY
+		"""
+		output_dict = {}
+		for name, value, uncertainty in zip(self.model.get_parameter_names(), self.parameters,
+											self.parameter_uncertainties):
+			output_dict[name] = value
+			output_dict['d' + name] = uncertainty
+		output_dict[config.RESULT_CHI_KEY] = self.chi
+		output_dict[config.RESULT_CHI_REDUCED_KEY] = self.chi_reduced
+		return output_dict
+
+	def plot(self, save_plot_name = None, plot = False, plot_format = config.DEFAULT_PLOT_FORMAT):
+		"""
+		plots the data points and fitted function
+		if save_plot_name is not None saves plot to current directory
+		with save_plot_name
+		if plot is true shows plot on screen
+		plot_format - one of config.PLOT_FORMATS
+		"""
+		# Imported here so fits without plots never import matplotlib
+		import plot_renderer
+		x = np.linspace(np.min(self.input.x_values),
+						np.max(self.input.x_values), 1000)
+		plot_renderer.plot_fit(self.input, x, self.model.evaluate(x, self.parameters),
+							   save_plot_name = save_plot_name, plot = plot, plot_format = plot_format)
+
+	def calculate(self):
+		"""
+		Calculates and changes object with the resulting
+		parameters, their uncertainties, chi and chi reduced values
+		"""
+		self.parameters, self.parameter_uncertainties = self.model.fit(self.input)
+		self.chi, self.chi_reduced = self.calculate_chi()
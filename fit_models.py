@@ -0,0 +1,313 @@
+import abc
+import config
+import numpy as np
+from lab_fit_exception import LabFitException
+from weighted_sums import create_weighted_sums
+
+class FitModel(abc.ABC):
+	"""
+	A function fitted to the data points
+	Every model evaluates itself, its x derivative and its parameter
+	gradients natively on numpy arrays, the parameters may be arrays
+	too so a batch of parameter sets is evaluated in one call
+	The fitted chi is the accurate chi of FitLinearCalculator,
+	with the effective uncertainties (dy^2 + (2 * f'(x) * dx)^2)^0.5
+	A model must implement every abstract method to be created
+	"""
+	NAME = None
+	FORMULA = None
+	PARAMETER_NAMES = []
+
+	def get_parameter_names(self):
+		return self.PARAMETER_NAMES
+
+	def get_formula(self):
+		return self.FORMULA
+
+	@abc.abstractmethod
+	def evaluate(self, x_values, parameters):
+		"""
+		Evaluates the function
+		parameters - a value for every parameter name, numbers or arrays
+					 which are broadcast against x_values
+		"""
+
+	@abc.abstractmethod
+	def calculate_derivative(self, x_values, parameters):
+		"""
+		Calculates the function's derivative by x
+		"""
+
+	@abc.abstractmethod
+	def calculate_parameter_gradients(self, x_values, parameters):
+		"""
+		Calculates the function's derivative by every parameter
+		returns an array shaped (len(x_values), parameters amount)
+		"""
+
+	@abc.abstractmethod
+	def calculate_initial_parameters(self, calc_input):
+		"""
+		Calculates the parameters the iterative fit starts from
+		"""
+
+	def evaluate_batch(self, x_values, parameter_sets):
+		"""
+		Evaluates the function of every parameter set
+		parameter_sets - an array shaped (sets amount, parameters amount)
+		returns an array shaped (sets amount, len(x_values))
+		"""
+		parameter_sets = np.asarray(parameter_sets)
+		return self.evaluate(x_values, tuple(parameter_sets[:, index, np.newaxis] \
+											 for index in range(parameter_sets.shape[1])))
+
+	def calculate_effective_uncertainties(self, calc_input, parameters):
+		"""
+		Calculates the y uncertainties including the x uncertainties
+		"""
+		dx_contribution = np.square(2 * self.calculate_derivative(calc_input.x_values, parameters) * \
+									calc_input.x_uncertainties)
+		return np.sqrt(np.square(calc_input.y_uncertainties) + dx_contribution)
+
+	def calculate_chi(self, calc_input, parameters):
+		"""
+		Calculates the accurate chi of parameters
+		"""
+		residuals = calc_input.y_values - self.evaluate(calc_input.x_values, parameters)
+		return np.sum(np.square(residuals / self.calculate_effective_uncertainties(calc_input,
+																				   parameters)))
+
+	def calculate_parameter_uncertainties(self, calc_input, parameters):
+		"""
+		Calculates the parameters' uncertainties, the square roots
+		of the diagonal of the effective variance covariance matrix
+		"""
+		weighted_gradients = self.calculate_parameter_gradients(calc_input.x_values, parameters) / \
+							 self.calculate_effective_uncertainties(calc_input, parameters)[:, np.newaxis]
+		covariance = np.linalg.pinv(np.dot(weighted_gradients.T, weighted_gradients))
+		return np.sqrt(np.diag(covariance))
+
+	def solve_weighted_least_squares(self, gradients, residuals, uncertainties):
+		"""
+		Solves the linear least squares of gradients * step = residuals
+		weighted by 1 / uncertainties^2
+		"""
+		step, _, _, _ = np.linalg.lstsq(gradients / uncertainties[:, np.newaxis],
+										residuals / uncertainties, rcond = None)
+		return step
+
+	def check_if_converged(self, parameters, previous_parameters, tolerance):
+		return np.all(np.abs(parameters - previous_parameters) <= tolerance * np.abs(parameters))
+
+	def fit(self, calc_input, max_iterations = config.MODEL_FIT_MAX_ITERATIONS,
+			tolerance = config.EFFECTIVE_VARIANCE_TOLERANCE):
+		"""
+		Fits the parameters with effective variance Gauss-Newton steps,
+		starting from self.calculate_initial_parameters
+		a step that raises the chi is halved until it lowers it
+		returns the parameters and their uncertainties
+		"""
+		x_values = calc_input.x_values
+		parameters = np.asarray(self.calculate_initial_parameters(calc_input), dtype = np.float64)
+		chi = self.calculate_chi(calc_input, parameters)
+		for iteration in range(max_iterations):
+			residuals = calc_input.y_values - self.evaluate(x_values, parameters)
+			step = self.solve_weighted_least_squares(self.calculate_parameter_gradients(x_values, parameters),
+													 residuals,
+													 self.calculate_effective_uncertainties(calc_input,
+																							parameters))
+			for halving in range(config.MODEL_FIT_MAX_STEP_HALVINGS):
+				next_parameters = parameters + step
+				next_chi = self.calculate_chi(calc_input, next_parameters)
+				if next_chi <= chi:
+					break
+				step = step / 2
+			else:
+				break
+
+			previous_parameters = parameters
+			parameters, chi = next_parameters, next_chi
+			if self.check_if_converged(parameters, previous_parameters, tolerance):
+				break
+
+		return parameters, self.calculate_parameter_uncertainties(calc_input, parameters)
+
+class LinearModel(FitModel):
+	"""The linear function y = a * x + b"""
+	NAME = 'linear'
+	FORMULA = 'y = a * x + b'
+	PARAMETER_NAMES = ['a', 'b']
+
+	def evaluate(self, x_values, parameters):
+		a_values, b_values = parameters
+		return a_values * x_values + b_values
+
+	def calculate_derivative(self, x_values, parameters):
+		a_values, b_values = parameters
+		return a_values * np.ones_like(x_values)
+
+	def calculate_parameter_gradients(self, x_values, parameters):
+		return np.column_stack((x_values, np.ones_like(x_values)))
+
+	def calculate_initial_parameters(self, calc_input):
+		a_value, a_uncertainty, b_value, b_uncertainty = \
+			calc_input.get_weighted_sums().calculate_linear_a_b_values()
+		return [a_value, b_value]
+
+class PolynomialModel(FitModel):
+	"""
+	The polynomial y = a0 + a1 * x + ... + an * x^n
+	linear in its parameters, so it is fitted by linear least squares
+	"""
+	NAME = 'polynomial'
+
+	def __init__(self, degree = config.DEFAULT_POLYNOMIAL_DEGREE):
+		super(PolynomialModel, self).__init__()
+		if degree < 1:
+			raise LabFitException(config.INVALID_POLYNOMIAL_DEGREE.format(degree))
+		self.degree = degree
+
+	def get_parameter_names(self):
+		return ['a{0}'.format(power) for power in range(self.degree + 1)]
+
+	def get_formula(self):
+		return 'y = ' + ' + '.join(['a0', 'a1 * x'][:self.degree + 1] + \
+								   ['a{0} * x^{0}'.format(power) for power in range(2, self.degree + 1)])
+
+	def evaluate(self, x_values, parameters):
+		# Horner's method, from the highest power down
+		result = parameters[-1] * np.ones_like(x_values)
+		for parameter in reversed(parameters[:-1]):
+			result = result * x_values + parameter
+		return result
+
+	def calculate_derivative(self, x_values, parameters):
+		result = np.zeros_like(x_values)
+		for power in range(len(parameters) - 1, 0, -1):
+			result = result * x_values + power * parameters[power]
+		return result
+
+	def calculate_parameter_gradients(self, x_values, parameters):
+		return np.vander(x_values, self.degree + 1, increasing = True)
+
+	def calculate_initial_parameters(self, calc_input):
+		return self.solve_weighted_least_squares(self.calculate_parameter_gradients(calc_input.x_values, None),
+												 calc_input.y_values, calc_input.y_uncertainties)
+
+	def fit(self, calc_input, max_iterations = config.MODEL_FIT_MAX_ITERATIONS,
+			tolerance = config.EFFECTIVE_VARIANCE_TOLERANCE):
+		"""
+		Fits the parameters with effective variance reweighted
+		linear least squares, repeated with the effective uncertainties
+		of the last parameters until they stop changing
+		returns the parameters and their uncertainties
+		"""
+		gradients = self.calculate_parameter_gradients(calc_input.x_values, None)
+		parameters = self.calculate_initial_parameters(calc_input)
+		for iteration in range(max_iterations):
+			previous_parameters = parameters
+			parameters = self.solve_weighted_least_squares(gradients, calc_input.y_values,
+														   self.calculate_effective_uncertainties(calc_input,
+																								  parameters))
+			if self.check_if_converged(parameters, previous_parameters, tolerance):
+				break
+
+		return parameters, self.calculate_parameter_uncertainties(calc_input, parameters)
+
+class ExponentialModel(FitModel):
+	"""
+	The exponential function y = a * exp(b * x)
+	starts from the linear fit of ln(y) = ln(a) + b * x
+	"""
+	NAME = 'exponential'
+	FORMULA = 'y = a * exp(b * x)'
+	PARAMETER_NAMES = ['a', 'b']
+
+	def evaluate(self, x_values, parameters):
+		a_values, b_values = parameters
+		return a_values * np.exp(b_values * x_values)
+
+	def calculate_derivative(self, x_values, parameters):
+		a_values, b_values = parameters
+		return a_values * b_values * np.exp(b_values * x_values)
+
+	def calculate_parameter_gradients(self, x_values, parameters):
+		a_value, b_value = parameters
+		exponent = np.exp(b_value * x_values)
+		return np.column_stack((exponent, a_value * x_values * exponent))
+
+	def calculate_initial_parameters(self, calc_input):
+		check_if_positive(calc_input.y_values, self.NAME)
+		slope, slope_uncertainty, intercept, intercept_uncertainty = \
+			create_weighted_sums(calc_input.x_values, np.log(calc_input.y_values),
+								 calc_input.y_uncertainties / calc_input.y_values,
+								 stable = calc_input.stable_sums).calculate_linear_a_b_values()
+		# The linear fit's slope is b and its intercept is ln(a)
+		return [np.exp(intercept), slope]
+
+class PowerModel(FitModel):
+	"""
+	The power law y = a * x^b
+	starts from the linear fit of ln(y) = ln(a) + b * ln(x)
+	"""
+	NAME = 'power'
+	FORMULA = 'y = a * x^b'
+	PARAMETER_NAMES = ['a', 'b']
+
+	def evaluate(self, x_values, parameters):
+		a_values, b_values = parameters
+		return a_values * np.power(x_values, b_values)
+
+	def calculate_derivative(self, x_values, parameters):
+		a_values, b_values = parameters
+		return a_values * b_values * np.power(x_values, b_values - 1)
+
+	def calculate_parameter_gradients(self, x_values, parameters):
+		a_value, b_value = parameters
+		power = np.power(x_values, b_value)
+		return np.column_stack((power, a_value * np.log(x_values) * power))
+
+	def calculate_initial_parameters(self, calc_input):
+		check_if_positive(calc_input.x_values, self.NAME)
+		check_if_positive(calc_input.y_values, self.NAME)
+		slope, slope_uncertainty, intercept, intercept_uncertainty = \
+			create_weighted_sums(np.log(calc_input.x_values), np.log(calc_input.y_values),
+								 calc_input.y_uncertainties / calc_input.y_values,
+								 stable = calc_input.stable_sums).calculate_linear_a_b_values()
+		# The linear fit's slope is b and its intercept is ln(a)
+		return [np.exp(intercept), slope]
+
+def check_if_positive(values, model_name):
+	"""
+	Checks that all values are positive, as the logarithm of
+	model_name's initial fit needs
+	"""
+	if np.min(values) <= 0:
+		raise LabFitException(config.INVALID_MODEL_DATA.format(model_name))
+
+MODELS = {LinearModel.NAME: LinearModel,
+		  PolynomialModel.NAME: PolynomialModel,
+		  ExponentialModel.NAME: ExponentialModel,
+		  PowerModel.NAME: PowerModel}
+
+def create_model(model_name = None, degree = None):
+	"""
+	Creates the model registered as model_name
+	model_name - if none config.DEFAULT_MODEL_NAME
+	degree - the polynomial's degree, if none config.DEFAULT_POLYNOMIAL_DEGREE
+	"""
+	model_name = model_name if model_name is not None else config.DEFAULT_MODEL_NAME
+	if model_name not in MODELS:
+		raise LabFitException(config.UNKNOWN_MODEL.format(model_name, ', '.join(sorted(MODELS))))
+	if model_name == PolynomialModel.NAME:
+		return PolynomialModel(degree if degree is not None else config.DEFAULT_POLYNOMIAL_DEGREE)
+	return MODELS[model_name]()
+
+def create_input_model(calc_input, model_name = None, degree = None):
+	"""
+	Creates the model fitted to calc_input, model_name and degree
+	are used over the ones chosen by the input file
+	"""
+	model_name = model_name if model_name is not None else calc_input.model_name
+	degree = degree if degree is not None else calc_input.model_degree
+	return create_model(model_name, degree)
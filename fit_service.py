@@ -0,0 +1,194 @@
+import sys
+import json
+import config
+import argparse
+import threading
+import traceback
+import socketserver
+import fit_models
+from concurrent.futures import ProcessPoolExecutor
+from lab_fit_exception import LabFitException
+from input_parser import InputParser
+from streaming_input_parser import create_input_parser
+from fit_linear_calculator import FitLinearCalculator
+from fit_model_calculator import FitModelCalculator
+
+def fit_request(request):
+	"""
+	Fits a single request, a dictionary of config.SERVICE_*_KEY
+	the data is the text of an input file, in any text format,
+	or the path of an input file
+	returns the response, errors are reported in its status
+	so a bad request will not stop the service
+	"""
+	response = {config.SERVICE_ID_KEY: request.get(config.SERVICE_ID_KEY),
+				config.SERVICE_STATUS_KEY: config.RESULT_STATUS_OK}
+	try:
+		bonus = request.get(config.SERVICE_BONUS_KEY, False)
+		if config.SERVICE_DATA_KEY in request:
+			input_parser = InputParser(raw_data = request[config.SERVICE_DATA_KEY],
+									   contains_ab_values = bonus)
+		elif config.SERVICE_FILE_PATH_KEY in request:
+			input_parser = create_input_parser(request[config.SERVICE_FILE_PATH_KEY],
+											   contains_ab_values = bonus)
+		else:
+			raise LabFitException(config.INVALID_SERVICE_REQUEST.format(config.SERVICE_DATA_KEY,
+																		config.SERVICE_FILE_PATH_KEY))
+		file_input = input_parser.start()
+		model = fit_models.create_input_model(file_input, request.get(config.SERVICE_MODEL_KEY),
+											  request.get(config.SERVICE_DEGREE_KEY))
+		if model.NAME != fit_models.LinearModel.NAME:
+			calculator = FitModelCalculator(file_input, model)
+			calculator.calculate()
+		else:
+			calculator = FitLinearCalculator(file_input)
+			calculator.calculate(chose_ab = bonus,
+								 adaptive = request.get(config.SERVICE_ADAPTIVE_KEY, False),
+								 iterative = request.get(config.SERVICE_ITERATIVE_KEY, False))
+		response[config.SERVICE_RESULT_KEY] = calculator.create_output_dict()
+	except LabFitException as e:
+		response[config.SERVICE_STATUS_KEY] = e.message
+	except Exception as e:
+		response[config.SERVICE_STATUS_KEY] = "{0} {1}".format(config.UNKNOWN_ERROR, repr(e))
+
+	return response
+
+class FitService(object):
+	"""
+	A long running process fitting requests of json lines,
+	every request is answered by a json line with the same id
+	The modules are imported once, if workers is above 1 the requests
+	are fitted by a pool of worker processes, at most
+	workers * config.PARALLEL_TASKS_PER_WORKER requests are pending at once
+	and the responses are written as they finish, not in order
+	"""
+	def __init__(self, workers = config.DEFAULT_WORKERS):
+		super(FitService, self).__init__()
+		self.workers = workers
+		self.executor = None
+		self.pending_requests = None
+		if workers > 1:
+			self.executor = ProcessPoolExecutor(max_workers = workers)
+			self.pending_requests = threading.BoundedSemaphore(workers * config.PARALLEL_TASKS_PER_WORKER)
+
+	def parse_request(self, row):
+		"""
+		Parses a request row, returns none and the error response
+		if the row is not a json object
+		"""
+		try:
+			request = json.loads(row)
+		except ValueError as e:
+			request = None
+		if not isinstance(request, dict):
+			return None, {config.SERVICE_ID_KEY: None,
+						  config.SERVICE_STATUS_KEY: config.INVALID_SERVICE_JSON}
+		return request, None
+
+	def handle_row(self, row, respond):
+		"""
+		Fits the request of row and calls respond with its response
+		respond may be called from another thread
+		"""
+		request, error_response = self.parse_request(row)
+		if request is None:
+			respond(error_response)
+		elif self.executor is None:
+			respond(fit_request(request))
+		else:
+			# Blocks while too many requests are pending
+			self.pending_requests.acquire()
+			future = self.executor.submit(fit_request, request)
+			future.add_done_callback(lambda future: self.finish_request(future, request, respond))
+
+	def finish_request(self, future, request, respond):
+		self.pending_requests.release()
+		try:
+			response = future.result()
+		except Exception as e:
+			# The worker process itself failed
+			response = {config.SERVICE_ID_KEY: request.get(config.SERVICE_ID_KEY),
+						config.SERVICE_STATUS_KEY: "{0} {1}".format(config.UNKNOWN_ERROR, repr(e))}
+		respond(response)
+
+	def serve_stream(self, input_stream, output_stream):
+		"""
+		Answers the request rows of input_stream into output_stream
+		until input_stream ends, empty rows are ignored
+		"""
+		output_lock = threading.Lock()
+		responses_written = threading.Semaphore(0)
+		def respond(response):
+			with output_lock:
+				output_stream.write(json.dumps(response) + '\n')
+				output_stream.flush()
+			responses_written.release()
+
+		requests_amount = 0
+		for row in input_stream:
+			if len(row.strip()) == 0:
+				continue
+			self.handle_row(row, respond)
+			requests_amount += 1
+
+		# Waits for the responses of the requests fitted by the workers
+		for request_index in range(requests_amount):
+			responses_written.acquire()
+
+	def serve_socket(self, port):
+		"""
+		Answers the request rows of every connection to port on
+		config.SERVICE_HOST, each connection is read by its own thread
+		"""
+		service = self
+		class RequestHandler(socketserver.StreamRequestHandler):
+			def handle(self):
+				input_stream = (row.decode() for row in self.rfile)
+				output_stream = SocketWriter(self.wfile)
+				service.serve_stream(input_stream, output_stream)
+
+		with socketserver.ThreadingTCPServer((config.SERVICE_HOST, port), RequestHandler) as server:
+			server.serve_forever()
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+
+class SocketWriter(object):
+	"""Writes text to a socket's binary file"""
+	def __init__(self, binary_file):
+		super(SocketWriter, self).__init__()
+		self.binary_file = binary_file
+
+	def write(self, text):
+		self.binary_file.write(text.encode())
+
+	def flush(self):
+		self.binary_file.flush()
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Fits the requests of json lines, from stdin or a local socket')
+	parser.add_argument('-p','--port', help='local port to serve, if not given serves stdin', type=int)
+	parser.add_argument('-w','--workers', help='amount of worker processes', type=int,
+						default=config.DEFAULT_WORKERS)
+	args = vars(parser.parse_args())
+	return args
+
+def main(port = None, workers = config.DEFAULT_WORKERS):
+	fit_service = FitService(workers = workers)
+	try:
+		if port is None:
+			fit_service.serve_stream(sys.stdin, sys.stdout)
+		else:
+			fit_service.serve_socket(port)
+	except KeyboardInterrupt as e:
+		pass
+	except Exception as e:
+		print("{0}:".format(config.UNKNOWN_ERROR))
+		traceback.print_exc()
+	finally:
+		fit_service.close()
+
+if __name__ == '__main__':
+	args_dict = parse_args()
+	main(args_dict['port'], args_dict['workers'])
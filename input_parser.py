@@ -3,7 +3,9 @@ import utils
 import numpy as np
 
 from lab_fit_exception import LabFitException
-from calc_input import CalcInput
+from calc_input import CalcInput, create_data_buffer
+from stage_timer import StageTimer
+import binary_input_file
 
 class InputParser(object):
 	"""
@@ -12,12 +14,22 @@ class InputParser(object):
 	"""
 	COLUMN_TYPE = 1
 	ROW_TYPE = 2
+	BINARY_TYPE = 3
 
-	def __init__(self, file_path = None, raw_data = None, contains_ab_values = False):
+	def __init__(self, file_path = None, raw_data = None, contains_ab_values = False,
+				 dtype = config.DEFAULT_DATA_DTYPE):
 		super(InputParser, self).__init__()
 		self.file_path = file_path
-		self.input = CalcInput()
+		self.raw_data = raw_data
+		self.data_lines = None
+		self.data_line_numbers = None
+		# The float type of text inputs' data, binary inputs keep their own
+		self.dtype = dtype
+		self.input = CalcInput(dtype = dtype)
 		self.contains_ab_values = contains_ab_values
+		# The data buffer of a row type input and its inserted columns
+		self.row_data = None
+		self.row_data_indexes = set()
 
 	def read_input_file(self):
 		"""
@@ -26,15 +38,33 @@ class InputParser(object):
 		"""
 		with open(self.file_path, 'r') as f:
 			self.raw_data = f.read()
+		self.data_lines = None
+
+	def get_data_lines(self):
+		"""
+		Returns the non empty rows of raw_data
+		the rows are split once and shared by every detection and parse stage,
+		their file line numbers are stored at self.data_line_numbers
+		"""
+		if self.data_lines is None:
+			self.data_lines, self.data_line_numbers = utils.index_non_empty_rows(self.raw_data.splitlines())
+		return self.data_lines
 
 	def parse_raw_data(self, data_type):
 		if InputParser.COLUMN_TYPE == data_type:
 			self.parse_data_column_type()
 		if InputParser.ROW_TYPE == data_type:
 			self.parse_data_row_type()
+		if InputParser.BINARY_TYPE == data_type:
+			self.parse_binary_type()
 		return False
 
 	def decide_input_data_type(self):
+		if self.check_if_binary_type():
+			return InputParser.BINARY_TYPE
+		# The text types are decided by the file's rows
+		if self.raw_data is None:
+			self.read_input_file()
 		if self.check_if_column_type():
 			return InputParser.COLUMN_TYPE
 		if self.check_if_row_type():
@@ -47,17 +77,20 @@ class InputParser(object):
 		Checks if the raw_data is of column type
 		checks first row for all four title names
 		"""
-		data_lines = self.raw_data.splitlines()
-		data_lines = utils.delete_empty_rows(data_lines)
+		data_lines = self.get_data_lines()
 
 		# Checks if input data is empty
 		if len(data_lines) == 0:
 			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
 												   config.EMPTY_INPUT_FILE))
 
-		title_line = data_lines[0].lower()
+		return self.check_if_titles(data_lines[0].lower().split())
 
-		for title in title_line.split():
+	def check_if_titles(self, titles):
+		"""
+		Checks that all of titles are data titles (x, dx, y, dy)
+		"""
+		for title in titles:
 			if title != config.X_COLUMN_NAME and \
 			   title != config.X_UNCERTAINTY_COLUMN_NAME and \
 			   title != config.Y_COLUMN_NAME and \
@@ -71,11 +104,55 @@ class InputParser(object):
 		Parses raw_data as a column type
 		and insert the data into self.input
 		"""
-		data_lines = self.raw_data.splitlines()
-		data_lines = utils.delete_empty_rows(data_lines)
-		titles = data_lines[0].lower().split()
+		data_lines = self.get_data_lines()
+		x_index, x_uncertainty_index, y_index, y_uncertainty_index = \
+			self.find_column_indexes(data_lines[0].lower().split())
+
+		# The data rows end at the first axis row
+		num_row_read = 1
+		while num_row_read < len(data_lines) and \
+			  not self.check_if_data_end(data_lines[num_row_read]):
+			num_row_read += 1
+
+		# Converts all the data rows together
+		rows_data = utils.convert_rows_to_floats(data_lines[1:num_row_read], config.MAX_DATA_TYPE_AMOUNT,
+												 self.data_line_numbers[1:num_row_read])
+		data = create_data_buffer(len(rows_data), self.dtype)
+		self.insert_rows(data, 0, rows_data, (x_index, x_uncertainty_index, y_index, y_uncertainty_index))
+		self.input.set_data(data)
+
+		# Retrieves the x and y axis names
+		self.parse_x_y_axis_names(data_lines, num_row_read)
+		# Retrieves the model, if the file chose one
+		self.parse_model(data_lines, num_row_read)
+		# Retrieves the a and b values, which are after the data rows
+		self.parse_a_b_values(data_lines, num_row_read)
+
+
+	def insert_rows(self, data, rows_start, rows_data, column_indexes):
+		"""
+		Copies rows_data, rows of the file's columns, into the data buffer
+		after rows_start rows, in the buffer's column order
+		column_indexes - the file column of x, dx, y and dy
+		"""
+		rows_end = rows_start + len(rows_data)
+		for data_index, column_index in zip(config.DATA_INDEXES, column_indexes):
+			data[rows_start:rows_end, data_index] = rows_data[:, column_index]
 
-		# Finds data indexes
+	def check_if_data_end(self, row):
+		"""
+		Checks if row is after the column type data rows,
+		an axis name row or a model row
+		"""
+		return row.find(config.AXIS_NAME) != -1 or \
+			   row.lower().find(config.MODEL_INPUT_STRING) != -1
+
+	def find_column_indexes(self, titles):
+		"""
+		Finds the column index of every data title
+		returns the x, dx, y, dy column indexes
+		"""
+		x_index, x_uncertainty_index, y_index, y_uncertainty_index = None, None, None, None
 		for index, title in enumerate(titles):
 			if title == config.X_COLUMN_NAME:
 				x_index = index
@@ -89,90 +166,85 @@ class InputParser(object):
 				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
 													   config.UNKNOWN_TITLE))
 
-		x_values = []
-		x_uncertainties = []
-		y_values = []
-		y_uncertainties = []
-
-		# Will hold the amount of rows read
-		num_row_read = 0
-		# Insert data into self.input object
-		for row in data_lines[1:]:
-			num_row_read += 1
-			# Means end of input
-			if row.find(config.AXIS_NAME) != -1:
-				break
-			data_line_columns = row.split()
-			# Checks for unified amount of data
-			if len(data_line_columns) != config.MAX_DATA_TYPE_AMOUNT:
-				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
-													   config.DIFFERENT_DATA_AMOUNTS))
-			x_values.append(data_line_columns[x_index])
-			x_uncertainties.append(data_line_columns[x_uncertainty_index])
-			y_values.append(data_line_columns[y_index])
-			y_uncertainties.append(data_line_columns[y_uncertainty_index])
-
-
-		self.input.x_values = np.array(utils.convert_str_list_to_floats(x_values))
-		self.input.x_uncertainties = np.array(utils.convert_str_list_to_floats(x_uncertainties))
-		self.input.y_values = np.array(utils.convert_str_list_to_floats(y_values))
-		self.input.y_uncertainties = np.array(utils.convert_str_list_to_floats(y_uncertainties))
-
-		# Retrieves the x and y axis names
-		self.parse_x_y_axis_names(data_lines, num_row_read)
-		# Retrieves the a and b values
-		self.parse_a_b_values(data_lines, config.MAX_DATA_TYPE_AMOUNT)
-
+		column_indexes = (x_index, x_uncertainty_index, y_index, y_uncertainty_index)
+		# A missing title has no column of data
+		if None in column_indexes:
+			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+												   config.DIFFERENT_DATA_AMOUNTS))
+		return column_indexes
 
 	def check_if_row_type(self):
 		"""
 		Checks if the raw_data is of row type
 		checks first element in the first config.MAX_DATA_TYPE_AMOUNT rows
 		"""
-		data_lines = self.raw_data.splitlines()
-		data_lines = utils.delete_empty_rows(data_lines)
+		data_lines = self.get_data_lines()
 		if len(data_lines) < config.MAX_DATA_TYPE_AMOUNT:
 			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
 													   config.NOT_ENOUGH_DATA_ROWS))
 
-		for row in data_lines[:config.MAX_DATA_TYPE_AMOUNT]:
-			data_columns = row.lower()
-			title = data_columns.split()[0]
-			if title != config.X_COLUMN_NAME and \
-			   title != config.X_UNCERTAINTY_COLUMN_NAME and \
-			   title != config.Y_COLUMN_NAME and \
-			   title != config.Y_UNCERTAINTY_COLUMN_NAME:
-			   return False
-
-		return True
+		titles = (row.lower().split()[0] for row in data_lines[:config.MAX_DATA_TYPE_AMOUNT])
+		return self.check_if_titles(titles)
 
 	def parse_data_row_type(self):
 		"""
 		Parses raw_data as a row type
 		and insert the data into self.input
 		"""
-		data_lines = self.raw_data.splitlines()
-		data_lines = utils.delete_empty_rows(data_lines)
-		for row in data_lines[:config.MAX_DATA_TYPE_AMOUNT]:
-			data_columns = row.lower().split()
-			title = data_columns[0]
-			if title == config.X_COLUMN_NAME:
-				self.input.x_values = np.array(utils.convert_str_list_to_floats(data_columns[1:]))
-			elif title == config.X_UNCERTAINTY_COLUMN_NAME:
-				self.input.x_uncertainties = np.array(utils.convert_str_list_to_floats(data_columns[1:]))
-			elif title == config.Y_COLUMN_NAME:
-				self.input.y_values = np.array(utils.convert_str_list_to_floats(data_columns[1:]))
-			elif title == config.Y_UNCERTAINTY_COLUMN_NAME:
-				self.input.y_uncertainties = np.array(utils.convert_str_list_to_floats(data_columns[1:]))
-			else:
-				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
-													   config.UNKNOWN_TITLE))
+		data_lines = self.get_data_lines()
+		for row, line_number in zip(data_lines[:config.MAX_DATA_TYPE_AMOUNT],
+									self.data_line_numbers):
+			self.parse_data_row(row, line_number)
+		self.finish_data_rows()
 
 		# Retrieves the x and y axis names
 		self.parse_x_y_axis_names(data_lines, config.MAX_DATA_TYPE_AMOUNT)
+		# Retrieves the model, if the file chose one
+		self.parse_model(data_lines, config.MAX_DATA_TYPE_AMOUNT)
 		# Retrieves the a and b values
 		self.parse_a_b_values(data_lines, config.MAX_DATA_TYPE_AMOUNT)
 
+	def parse_data_row(self, row, line_number = None):
+		"""
+		Parses a single row of a row type input
+		and insert its data into self.input by its title
+		line_number - the row's line in the input file, for the error message
+		"""
+		data_columns = row.lower().split()
+		title = data_columns[0]
+		data_values = data_columns[1:]
+		if title == config.X_COLUMN_NAME:
+			data_index = config.DATA_X_INDEX
+		elif title == config.X_UNCERTAINTY_COLUMN_NAME:
+			data_index = config.DATA_X_UNCERTAINTY_INDEX
+		elif title == config.Y_COLUMN_NAME:
+			data_index = config.DATA_Y_INDEX
+		elif title == config.Y_UNCERTAINTY_COLUMN_NAME:
+			data_index = config.DATA_Y_UNCERTAINTY_INDEX
+		else:
+			raise utils.create_input_error(config.UNKNOWN_TITLE, line_number)
+
+		values = utils.convert_str_list_to_floats(data_values, line_number)
+		# The first data row decides the amount of data points
+		if self.row_data is None:
+			self.row_data = create_data_buffer(len(values), self.dtype)
+		# A repeated title would leave another column without data
+		if len(values) != len(self.row_data) or data_index in self.row_data_indexes:
+			raise utils.create_input_error(config.DIFFERENT_DATA_AMOUNTS, line_number)
+		self.row_data[:, data_index] = values
+		self.row_data_indexes.add(data_index)
+
+	def finish_data_rows(self):
+		"""
+		Inserts the row type data buffer into self.input,
+		after all of its data rows were parsed
+		"""
+		# A missing title leaves its column without data
+		if len(self.row_data_indexes) != config.MAX_DATA_TYPE_AMOUNT:
+			raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+												   config.DIFFERENT_DATA_AMOUNTS))
+		self.input.set_data(self.row_data)
+
 	def parse_x_y_axis_names(self, data_lines, start_line):
 		"""
 		Retrieves the x and y axis names from the data_lines
@@ -185,6 +257,30 @@ class InputParser(object):
 			if row.find(config.Y_AXIS_INPUT_STRING) != -1:
 				self.input.y_axis_title = row[len(config.Y_AXIS_INPUT_STRING):].strip()
 
+	def parse_model(self, data_lines, start_line):
+		"""
+		Retrieves the model from the data_lines, a row of
+		config.MODEL_INPUT_STRING followed by the model name
+		and an optional polynomial degree
+		and inserts the model to self.input
+		start_line - the first line to start to check for the model
+		"""
+		for row in data_lines[start_line:]:
+			model_index = row.lower().find(config.MODEL_INPUT_STRING)
+			if model_index == -1:
+				continue
+			model_values = row[model_index + len(config.MODEL_INPUT_STRING):].lower().split()
+			if len(model_values) == 0 or len(model_values) > 2:
+				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+													   config.INVALID_MODEL_ROW))
+			self.input.model_name = model_values[0]
+			if len(model_values) == 2:
+				try:
+					self.input.model_degree = int(model_values[1])
+				except ValueError as e:
+					raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+														   config.INVALID_MODEL_ROW))
+
 	def parse_a_b_values(self, data_lines, start_line):
 		"""
 		Retrieves the a and b values from the data_lines
@@ -199,25 +295,67 @@ class InputParser(object):
 		for row in data_lines[start_line:]:
 			if row.find(config.A_VALUES_INPUT_STRING) != -1:
 				a_values = row[len(config.A_VALUES_INPUT_STRING):].strip().split()
-				a_values = utils.convert_str_list_to_floats(a_values)
-				self.input.a_step_size = a_values[config.AB_VALUES_STEP_INDEX]
-				self.input.a_values = np.append(np.arange(a_values[config.AB_VALUES_START_INDEX],
-														  a_values[config.AB_VALUES_END_INDEX],
-														  a_values[config.AB_VALUES_STEP_INDEX]),
-												a_values[config.AB_VALUES_END_INDEX])
+				self.set_a_values(utils.convert_str_list_to_floats(a_values))
 			if row.find(config.B_VALUES_INPUT_STRING) != -1:
 				b_values = row[len(config.B_VALUES_INPUT_STRING):].strip().split()
-				b_values = utils.convert_str_list_to_floats(b_values)
-				self.input.b_step_size = b_values[config.AB_VALUES_STEP_INDEX]
-				self.input.b_values = np.append(np.arange(b_values[config.AB_VALUES_START_INDEX],
-														  b_values[config.AB_VALUES_END_INDEX],
-														  b_values[config.AB_VALUES_STEP_INDEX]),
-												b_values[config.AB_VALUES_END_INDEX])
+				self.set_b_values(utils.convert_str_list_to_floats(b_values))
+
+		self.update_contains_ab_values()
 
+	def set_a_values(self, a_range):
+		"""
+		Inserts the a values of a_range (start, end, step) to self.input
+		"""
+		self.input.a_step_size = a_range[config.AB_VALUES_STEP_INDEX]
+		self.input.a_values = np.append(np.arange(a_range[config.AB_VALUES_START_INDEX],
+												  a_range[config.AB_VALUES_END_INDEX],
+												  a_range[config.AB_VALUES_STEP_INDEX]),
+										a_range[config.AB_VALUES_END_INDEX])
+
+	def set_b_values(self, b_range):
+		"""
+		Inserts the b values of b_range (start, end, step) to self.input
+		"""
+		self.input.b_step_size = b_range[config.AB_VALUES_STEP_INDEX]
+		self.input.b_values = np.append(np.arange(b_range[config.AB_VALUES_START_INDEX],
+												  b_range[config.AB_VALUES_END_INDEX],
+												  b_range[config.AB_VALUES_STEP_INDEX]),
+										b_range[config.AB_VALUES_END_INDEX])
+
+	def update_contains_ab_values(self):
 		if type(self.input.a_values) != type(None) and self.input.a_values.all() \
 		   and type(self.input.b_values) != type(None) and self.input.b_values.all():
 			self.input.contains_ab_values = True
 
+	def check_if_binary_type(self):
+		"""
+		Checks if the input file is of binary type,
+		a numpy npz file, by its first bytes
+		"""
+		if self.raw_data is not None:
+			return False
+		with open(self.file_path, 'rb') as f:
+			return f.read(len(config.BINARY_FILE_MAGIC)) == config.BINARY_FILE_MAGIC
+
+	def parse_binary_type(self):
+		"""
+		Parses a binary type input file and insert the data into self.input
+		the data buffer is a memory mapped view of the file
+		"""
+		binary_input = binary_input_file.load_binary_input(self.file_path)
+		self.input.set_data(binary_input[config.BINARY_DATA_KEY])
+		self.input.x_axis_title = binary_input[config.BINARY_X_AXIS_KEY]
+		self.input.y_axis_title = binary_input[config.BINARY_Y_AXIS_KEY]
+
+		# If called without, should quietly ignore the a and b values
+		if not self.contains_ab_values:
+			return None
+
+		if len(binary_input[config.BINARY_A_RANGE_KEY]) != 0:
+			self.set_a_values(binary_input[config.BINARY_A_RANGE_KEY])
+		if len(binary_input[config.BINARY_B_RANGE_KEY]) != 0:
+			self.set_b_values(binary_input[config.BINARY_B_RANGE_KEY])
+		self.update_contains_ab_values()
 
 	def is_valid(self):
 		"""
@@ -226,11 +364,19 @@ class InputParser(object):
 		"""
 		self.input.is_valid()
 
-	def start(self):
-		self.read_input_file()
-		data_type = self.decide_input_data_type()
-		self.parse_raw_data(data_type)
-		self.is_valid()
+	def start(self, timer = None):
+		"""
+		Parses the input and returns the CalcInput
+		timer - a StageTimer recording the read, parse and validate stages
+		"""
+		timer = timer if timer is not None else StageTimer()
+		with timer.stage('read'):
+			data_type = self.decide_input_data_type()
+		with timer.stage('parse'):
+			self.parse_raw_data(data_type)
+		with timer.stage('validate'):
+			self.is_valid()
+		timer.add_counter('rows_parsed', len(self.input.x_values))
 		return self.input
 		
 def main():
@@ -1,50 +1,249 @@
+import os
+import sys
 import config
 import utils
+import cProfile
+import contextlib
 import traceback
 from lab_fit_exception import LabFitException
-from input_parser import InputParser
+from streaming_input_parser import create_input_parser
 from fit_linear_calculator import FitLinearCalculator
+from fit_model_calculator import FitModelCalculator
+import fit_models
+from stage_timer import StageTimer
+from bootstrap_estimator import BootstrapEstimator
+from result_cache import ResultCache, OutputRecorder
 import argparse
 
 
 
-def search_best_parameter(file_path):
-	input_parser = InputParser(file_path = file_path, contains_ab_values = True)
-	file_input = input_parser.start()
+def fit_model(file_input, model, no_plot = False, plot_format = config.DEFAULT_PLOT_FORMAT,
+			  timer = None):
+	timer = timer if timer is not None else StageTimer()
+	model_calc = FitModelCalculator(file_input, model)
+	with timer.stage('fit'):
+		model_calc.calculate()
+	with timer.stage('output'):
+		model_calc.print_output()
+	if not no_plot:
+		with timer.stage('plot'):
+			model_calc.plot(save_plot_name = config.MODEL_PLOT_FILE_NAME, plot_format = plot_format)
+
+def estimate_with_bootstrap(linear_calc, replicas_amount, seed = None, iterative = False,
+							workers = config.DEFAULT_WORKERS):
+	"""
+	Prints the bootstrap distributions of the linear fit's a and b values
+	the iterative fit's data sets are weighted with its effective uncertainties
+	"""
+	weight_uncertainties = linear_calc.calculate_effective_uncertainties() if iterative else None
+	bootstrap_estimator = BootstrapEstimator(linear_calc.input, replicas_amount = replicas_amount,
+											 seed = seed, weight_uncertainties = weight_uncertainties,
+											 workers = workers)
+	bootstrap_estimator.calculate()
+	bootstrap_estimator.print_output()
+
+def add_fit_counters(timer, linear_calc):
+	timer.add_counter('chi_evaluations', linear_calc.chi_evaluations)
+	timer.add_counter('grid_cells', linear_calc.grid_cells_evaluated)
+
+def search_best_parameter(file_path, adaptive = False, iterative = False, cross_check = False,
+						  workers = config.DEFAULT_WORKERS, model_name = None, degree = None,
+						  no_plot = False, plot_format = config.DEFAULT_PLOT_FORMAT, timer = None,
+						  bootstrap = None, seed = None, contours = False,
+						  dtype = config.DEFAULT_DATA_DTYPE, stable = False):
+	timer = timer if timer is not None else StageTimer()
+	input_parser = create_input_parser(file_path, contains_ab_values = True, dtype = dtype)
+	file_input = input_parser.start(timer)
+	file_input.set_stable_sums(stable)
+	model = fit_models.create_input_model(file_input, model_name, degree)
+	# The a and b grid is of the linear model only
+	if model.NAME != fit_models.LinearModel.NAME:
+		return fit_model(file_input, model, no_plot = no_plot, plot_format = plot_format, timer = timer)
 	linear_calc = FitLinearCalculator(file_input)
-	linear_calc.calculate(chose_ab = True)
-	linear_calc.print_output()
-	linear_calc.plot(save_plot_name = config.LINEAR_PLOT_FILE_NAME)
-	linear_calc.create_and_plot_a_chosing_plot(save_plot_name = config.A_PLOT_FILE_NAME)
-
-def fit_linear(file_path):
-	input_parser = InputParser(file_path = file_path)
-	file_input = input_parser.start()
+	contours = contours and file_input.contains_ab_values
+	with timer.stage('fit'):
+		# The full grid search keeps the chi surface of the contours
+		linear_calc.calculate(chose_ab = True, adaptive = adaptive, iterative = iterative,
+							  workers = workers, keep_surface = contours)
+	with timer.stage('output'):
+		linear_calc.print_output()
+		if adaptive and not iterative and file_input.contains_ab_values:
+			linear_calc.print_grid_cells_evaluated()
+	if iterative and cross_check and file_input.contains_ab_values:
+		with timer.stage('cross_check'):
+			linear_calc.print_cross_check(*linear_calc.cross_check_with_grid(adaptive = adaptive))
+	if bootstrap:
+		with timer.stage('bootstrap'):
+			estimate_with_bootstrap(linear_calc, bootstrap, seed = seed, iterative = iterative,
+									workers = workers)
+	if contours:
+		with timer.stage('contours'):
+			chi_surface = linear_calc.create_chi_surface()
+			chi_surface.write_json(config.CONTOUR_JSON_FILE_NAME)
+	if not no_plot:
+		with timer.stage('plot'):
+			linear_calc.plot(save_plot_name = config.LINEAR_PLOT_FILE_NAME, plot_format = plot_format)
+			linear_calc.create_and_plot_a_chosing_plot(save_plot_name = config.A_PLOT_FILE_NAME,
+													   plot_format = plot_format)
+			if contours:
+				chi_surface.plot(save_plot_name = config.CONTOUR_PLOT_FILE_NAME, plot_format = plot_format)
+	add_fit_counters(timer, linear_calc)
+
+def fit_linear(file_path, iterative = False, model_name = None, degree = None, no_plot = False,
+			   plot_format = config.DEFAULT_PLOT_FORMAT, timer = None, bootstrap = None, seed = None,
+			   workers = config.DEFAULT_WORKERS, dtype = config.DEFAULT_DATA_DTYPE, stable = False):
+	timer = timer if timer is not None else StageTimer()
+	input_parser = create_input_parser(file_path, dtype = dtype)
+	file_input = input_parser.start(timer)
+	file_input.set_stable_sums(stable)
+	model = fit_models.create_input_model(file_input, model_name, degree)
+	if model.NAME != fit_models.LinearModel.NAME:
+		return fit_model(file_input, model, no_plot = no_plot, plot_format = plot_format, timer = timer)
 	linear_calc = FitLinearCalculator(file_input)
-	linear_calc.calculate()
-	linear_calc.print_output()
-	linear_calc.plot(save_plot_name = config.LINEAR_PLOT_FILE_NAME)
+	with timer.stage('fit'):
+		linear_calc.calculate(iterative = iterative)
+	with timer.stage('output'):
+		linear_calc.print_output()
+	if bootstrap:
+		with timer.stage('bootstrap'):
+			estimate_with_bootstrap(linear_calc, bootstrap, seed = seed, iterative = iterative,
+									workers = workers)
+	if not no_plot:
+		with timer.stage('plot'):
+			linear_calc.plot(save_plot_name = config.LINEAR_PLOT_FILE_NAME, plot_format = plot_format)
+	add_fit_counters(timer, linear_calc)
+
+def create_output_file_names(plot_format = config.DEFAULT_PLOT_FORMAT):
+	"""
+	Creates the names of every file a fit may write to the current directory
+	"""
+	plot_names = [config.LINEAR_PLOT_FILE_NAME, config.A_PLOT_FILE_NAME,
+				  config.MODEL_PLOT_FILE_NAME, config.CONTOUR_PLOT_FILE_NAME]
+	return [plot_name + '.' + plot_format for plot_name in plot_names] + [config.CONTOUR_JSON_FILE_NAME]
+
+def get_modified_times(file_names):
+	return {file_name: os.path.getmtime(file_name) for file_name in file_names \
+			if os.path.isfile(file_name)}
+
+def fit_with_cache(result_cache, file_path, options, fit, timer):
+	"""
+	Prints the cached output of an earlier fit of the same file content
+	and options, and restores its files into the current directory
+	if there is none calls fit, and caches its output and the files it wrote
+	options - every option which changes the fit's output
+	"""
+	with timer.stage('cache'):
+		cache_key = result_cache.create_key(file_path, options)
+		entry = result_cache.load(cache_key)
+		if entry is not None:
+			sys.stdout.write(entry['output'])
+			for file_name in entry['plots']:
+				result_cache.restore_plot(entry, file_name, file_name)
+			return
+
+	file_names = create_output_file_names(options['plot_format'])
+	previous_modified_times = get_modified_times(file_names)
+	output_recorder = OutputRecorder(sys.stdout)
+	with contextlib.redirect_stdout(output_recorder):
+		fit()
+
+	with timer.stage('cache'):
+		written_file_names = [file_name for file_name, modified_time in get_modified_times(file_names).items() \
+							  if modified_time != previous_modified_times.get(file_name)]
+		result_cache.store(cache_key, output = output_recorder.getvalue(),
+						   plot_paths = {file_name: file_name for file_name in written_file_names})
 
 def parse_args():
 	parser = argparse.ArgumentParser(description='Fits a function to a data set')
 	parser.add_argument('-f','--file_path', help='data file path', required=True)
 	parser.add_argument('-b','--bonus', help='bonus data file path', action="store_true")
+	parser.add_argument('-a','--adaptive', help='coarse to fine search of the bonus a and b values',
+						action="store_true")
+	parser.add_argument('-i','--iterative', help='effective variance fit of the accurate chi, without a grid',
+						action="store_true")
+	parser.add_argument('-c','--cross_check', help='cross check the iterative fit with the bonus grid',
+						action="store_true")
+	parser.add_argument('-w','--workers', help='amount of worker processes of the bonus grid search and the bootstrap',
+						type=int, default=config.DEFAULT_WORKERS)
+	parser.add_argument('-m','--model', help='fitted model, overrides the data file\'s model row',
+						choices=sorted(fit_models.MODELS))
+	parser.add_argument('-d','--degree', help='degree of the polynomial model', type=int)
+	parser.add_argument('-n','--no_plot', help='only print the fit, without plotting',
+						action="store_true")
+	parser.add_argument('-p','--plot_format', help='plot file format', choices=config.PLOT_FORMATS,
+						default=config.DEFAULT_PLOT_FORMAT)
+	parser.add_argument('--bootstrap', help='amount of synthetic data sets of a bootstrap of the linear fit',
+						type=int)
+	parser.add_argument('--seed', help='random seed of the bootstrap', type=int)
+	parser.add_argument('--contours', help='write and plot the bonus grid\'s chi contours and profiles',
+						action="store_true")
+	parser.add_argument('--dtype', help='float type of the data, float32 halves its memory',
+						choices=config.DATA_DTYPES, default=config.DEFAULT_DATA_DTYPE)
+	parser.add_argument('--stable', help='centered sums of the linear fit, for data far from 0',
+						action="store_true")
+	parser.add_argument('--no_cache', help='fit again even if the same file and options were fitted before',
+						action="store_true")
+	parser.add_argument('--cache_dir', help='directory of the fit result cache',
+						default=config.RESULT_CACHE_DIRECTORY)
+	parser.add_argument('--timings', help='json path of the per stage timing report')
+	parser.add_argument('--profile', help='path of a cProfile dump of the whole run')
 	args = vars(parser.parse_args())
 	return args
 
 
-def main(file_path, bonus):
-	try:
+def main(file_path, bonus, adaptive = False, iterative = False, cross_check = False,
+		 workers = config.DEFAULT_WORKERS, model_name = None, degree = None, no_plot = False,
+		 plot_format = config.DEFAULT_PLOT_FORMAT, timings_path = None, profile_path = None,
+		 bootstrap = None, seed = None, contours = False, no_cache = False,
+		 cache_directory = config.RESULT_CACHE_DIRECTORY, dtype = config.DEFAULT_DATA_DTYPE,
+		 stable = False):
+	# Memory is traced only for the timing report, it slows the run
+	timer = StageTimer(trace_memory = timings_path is not None)
+	profiler = cProfile.Profile() if profile_path is not None else None
+	def fit():
 		if bonus:
-			search_best_parameter(file_path)
+			search_best_parameter(file_path, adaptive = adaptive, iterative = iterative,
+								  cross_check = cross_check, workers = workers,
+								  model_name = model_name, degree = degree, no_plot = no_plot,
+								  plot_format = plot_format, timer = timer, bootstrap = bootstrap,
+								  seed = seed, contours = contours, dtype = dtype, stable = stable)
+		else:
+			fit_linear(file_path, iterative = iterative, model_name = model_name, degree = degree,
+					   no_plot = no_plot, plot_format = plot_format, timer = timer,
+					   bootstrap = bootstrap, seed = seed, workers = workers, dtype = dtype,
+					   stable = stable)
+
+	# The workers do not change the output, a bootstrap without a seed does
+	options = {'bonus': bonus, 'adaptive': adaptive, 'iterative': iterative,
+			   'cross_check': cross_check, 'model': model_name, 'degree': degree,
+			   'no_plot': no_plot, 'plot_format': plot_format, 'bootstrap': bootstrap,
+			   'seed': seed, 'contours': contours, 'dtype': dtype, 'stable': stable}
+	use_cache = not no_cache and not (bootstrap and seed is None)
+	try:
+		if profiler is not None:
+			profiler.enable()
+		if use_cache:
+			fit_with_cache(ResultCache(cache_directory), file_path, options, fit, timer)
 		else:
-			fit_linear(file_path)
+			fit()
 	except LabFitException as e:
 		print(e.message)
 	except Exception as e:
 		print("{0}:".format(config.UNKNOWN_ERROR))
 		traceback.print_exc()
+	finally:
+		# The reports are written for failed runs too
+		if profiler is not None:
+			profiler.disable()
+			profiler.dump_stats(profile_path)
+		if timings_path is not None:
+			timer.write_report(timings_path)
 
 if __name__ == '__main__':
 	args_dict = parse_args()
-	main(args_dict['file_path'], args_dict['bonus'])
\ No newline at end of file
+	main(args_dict['file_path'], args_dict['bonus'], args_dict['adaptive'],
+		 args_dict['iterative'], args_dict['cross_check'], args_dict['workers'],
+		 args_dict['model'], args_dict['degree'], args_dict['no_plot'], args_dict['plot_format'],
+		 args_dict['timings'], args_dict['profile'], args_dict['bootstrap'], args_dict['seed'],
+		 args_dict['contours'], args_dict['no_cache'], args_dict['cache_dir'], args_dict['dtype'],
+		 args_dict['stable'])
\ No newline at end of file
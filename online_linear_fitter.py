@@ -0,0 +1,108 @@
+import config
+from collections import deque
+from weighted_sums import WeightedSums, CenteredWeightedSums
+
+class OnlineLinearFitter(object):
+	"""
+	Fits a linear function to data points which arrive over time
+	Keeps running weighted sums, so adding or removing a point is O(1)
+	and the fit's values are available at any time without the data
+	window_size - if set only the last window_size points are fitted,
+				  older points are removed as new points are added
+	stable - if true, the default, keeps CenteredWeightedSums, so the values
+			 match FitLinearCalculator's also for points far from 0, like
+			 timestamps, and after removals, the raw WeightedSums lose
+			 their digits in both cases
+	"""
+	def __init__(self, window_size = None,
+				 refresh_interval = config.ONLINE_REFRESH_INTERVAL, stable = True):
+		super(OnlineLinearFitter, self).__init__()
+		self.window_size = window_size
+		# A refresh reads the whole window, so it is not done more often
+		# than once per window_size removals
+		self.refresh_interval = max(refresh_interval, window_size or 0)
+		self.sums_class = CenteredWeightedSums if stable else WeightedSums
+		self.weighted_sums = self.sums_class()
+		self.window = deque()
+		self.removed_amount = 0
+		self.a_value = 0
+		self.a_uncertainty = 0
+		self.b_value = 0
+		self.b_uncertainty = 0
+		self.chi = 0
+		self.chi_reduced = 0
+
+	def add_point(self, x_value, y_value, y_uncertainty):
+		"""
+		Adds a data point, if the window is full its oldest point is removed
+		"""
+		self.weighted_sums.add_point(x_value, y_value, y_uncertainty)
+		if self.window_size is None:
+			return None
+
+		self.window.append((x_value, y_value, y_uncertainty))
+		if len(self.window) > self.window_size:
+			self.remove_point(*self.window.popleft())
+
+	def add_points(self, x_values, y_values, y_uncertainties):
+		"""
+		Adds a batch of data points, in their order
+		"""
+		if self.window_size is None:
+			self.weighted_sums.add_arrays(x_values, y_values, y_uncertainties)
+			return None
+
+		for point in zip(x_values, y_values, y_uncertainties):
+			self.add_point(*point)
+
+	def remove_point(self, x_value, y_value, y_uncertainty):
+		"""
+		Removes a data point that was added before
+		Removing leaves rounding errors in the sums, so with a window
+		the sums are recalculated from the window every
+		max(refresh_interval, window_size) removals, which keeps the
+		cost O(1) per point on average
+		"""
+		self.weighted_sums.remove_point(x_value, y_value, y_uncertainty)
+		self.removed_amount += 1
+		if self.window_size is not None and self.removed_amount % self.refresh_interval == 0:
+			self.refresh()
+
+	def refresh(self):
+		"""
+		Recalculates the weighted sums from the points in the window
+		"""
+		self.weighted_sums = self.sums_class()
+		for point in self.window:
+			self.weighted_sums.add_point(*point)
+
+	def calculate(self):
+		"""
+		Calculates and changes object with the resulting
+		a b chi and chi reduced values of the current points,
+		same as FitLinearCalculator.calculate on the same points
+		"""
+		self.a_value, self.a_uncertainty, self.b_value, self.b_uncertainty = \
+			self.weighted_sums.calculate_linear_a_b_values()
+		self.chi = self.weighted_sums.calculate_chi(self.a_value, self.b_value)
+		self.chi_reduced = self.chi / (self.weighted_sums.count - 2)
+
+	def create_output_dict(self):
+		"""
+		Creates a dictionary of the printed output values,
+		the keys are the config.RESULT_*_KEY names
+		"""
+		return {config.RESULT_A_KEY: self.a_value,
+				config.RESULT_A_UNCERTAINTY_KEY: self.a_uncertainty,
+				config.RESULT_B_KEY: self.b_value,
+				config.RESULT_B_UNCERTAINTY_KEY: self.b_uncertainty,
+				config.RESULT_CHI_KEY: self.chi,
+				config.RESULT_CHI_REDUCED_KEY: self.chi_reduced}
+
+	def print_output(self):
+		print(config.LINEAR_OUTPUT_FORMAT.format(self.a_value,
+												 self.a_uncertainty,
+												 self.b_value,
+												 self.b_uncertainty,
+												 self.chi,
+												 self.chi_reduced))
@@ -0,0 +1,86 @@
+import config
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from calc_input import CalcInput
+from chi_grid_calculator import ChiGridCalculator
+
+# The grid calculator of a worker process, created once by init_grid_worker
+worker_grid_calculator = None
+worker_a_values = None
+worker_b_values = None
+
+def map_in_order(function, items, workers, initializer = None, initargs = ()):
+	"""
+	Calls function on every item in a pool of worker processes
+	yields the results in the items order
+	At most workers * config.PARALLEL_TASKS_PER_WORKER tasks are submitted
+	at once, so the memory stays bounded for any amount of items
+	function and items must be picklable
+	"""
+	max_pending = workers * config.PARALLEL_TASKS_PER_WORKER
+	with ProcessPoolExecutor(max_workers = workers, initializer = initializer,
+							 initargs = initargs) as executor:
+		pending = deque()
+		for item in items:
+			pending.append(executor.submit(function, item))
+			if len(pending) >= max_pending:
+				yield pending.popleft().result()
+
+		while pending:
+			yield pending.popleft().result()
+
+def init_grid_worker(data, a_values, b_values, memory_budget):
+	"""
+	Creates the worker's grid calculator once, instead of sending
+	the data with every task
+	data - the input's data buffer
+	"""
+	global worker_grid_calculator, worker_a_values, worker_b_values
+	grid_input = CalcInput()
+	grid_input.set_data(data)
+	worker_grid_calculator = ChiGridCalculator(grid_input, memory_budget = memory_budget)
+	worker_a_values = a_values
+	worker_b_values = b_values
+
+def find_best_indexes_of_a_range(a_range):
+	"""
+	Finds the best grid cell of the a values between a_range's indexes
+	returns best_a_index, best_b_index, best_chi, cells_evaluated
+	"""
+	a_start, a_end = a_range
+	worker_grid_calculator.cells_evaluated = 0
+	a_index, b_index, best_chi, surface = worker_grid_calculator.find_best_indexes(worker_a_values[a_start:a_end],
+																				  worker_b_values)
+	return a_start + a_index, b_index, best_chi, worker_grid_calculator.cells_evaluated
+
+def find_best_a_b_values_parallel(input_obj, a_values, b_values, workers,
+								  memory_budget = config.CHI_GRID_MEMORY_BUDGET):
+	"""
+	Same as ChiGridCalculator.find_best_a_b_values, with the a values
+	split into ranges which are searched by a pool of worker processes
+	The ranges are reduced in order with the grid order tie break,
+	so the result is identical to the serial search
+	returns best_a, best_b, best_chi, cells_evaluated
+	"""
+	ranges_amount = min(len(a_values), workers * config.PARALLEL_GRID_RANGES_PER_WORKER)
+	range_edges = np.linspace(0, len(a_values), ranges_amount + 1).astype(int)
+	a_ranges = list(zip(range_edges[:-1], range_edges[1:]))
+	data = input_obj.data
+
+	best_a_index = 0
+	best_b_index = 0
+	best_chi = None
+	cells_evaluated = 0
+	for a_index, b_index, range_chi, range_cells in map_in_order(find_best_indexes_of_a_range, a_ranges, workers,
+																 initializer = init_grid_worker,
+																 initargs = (data, a_values, b_values,
+																			 memory_budget)):
+		cells_evaluated += range_cells
+		if best_chi is None or range_chi < best_chi or \
+		   (range_chi == best_chi and (a_index, b_index) < (best_a_index, best_b_index)):
+			best_chi = range_chi
+			best_a_index = a_index
+			best_b_index = b_index
+
+	return a_values[best_a_index], b_values[best_b_index], best_chi, cells_evaluated
@@ -0,0 +1,140 @@
+import config
+import numpy as np
+import matplotlib.pyplot as plt
+
+# The calculators import this module only when they plot,
+# so fits without plots never import matplotlib
+
+# The figure every plot is drawn on, created by the first plot
+# and cleared for the next one instead of being closed
+reused_figure = None
+
+def get_figure():
+	"""
+	Returns the cleared reused figure, creates it on the first call
+	"""
+	global reused_figure
+	if reused_figure is None or not plt.fignum_exists(reused_figure.number):
+		reused_figure = plt.figure()
+	reused_figure.clf()
+	# A plot may have resized the figure
+	reused_figure.set_size_inches(plt.rcParams['figure.figsize'])
+	return reused_figure
+
+def finish_plot(figure, save_plot_name = None, plot = False,
+				plot_format = config.DEFAULT_PLOT_FORMAT, bbox_inches = None):
+	"""
+	Shows and saves the figure and clears it for the next plot
+	if save_plot_name is not None saves plot to current directory
+	with save_plot_name and the plot_format extension
+	if plot is true shows plot on screen
+	"""
+	if plot:
+		plt.show()
+
+	if save_plot_name:
+		figure.savefig(save_plot_name + '.' + plot_format, bbox_inches = bbox_inches,
+					   dpi = config.PLOT_RASTER_DPI)
+
+	# Clears the figure so it won't show when another function calls plt.show()
+	# This happens regardless of if plt.show was called in this function
+	figure.clf()
+
+def decimate_points(x_values, max_points):
+	"""
+	Returns the indexes of at most max_points points, evenly
+	spread along the sorted x values, the indexes of all the
+	points if there are not more than max_points
+	"""
+	if len(x_values) <= max_points:
+		return np.arange(len(x_values))
+	stride = int(np.ceil(len(x_values) / max_points))
+	return np.argsort(x_values, kind = 'stable')[::stride]
+
+def plot_density(ax, x_values, y_values):
+	"""
+	Plots the density of the data points as an image
+	of config.PLOT_DENSITY_BINS bins on each axis
+	"""
+	counts, x_edges, y_edges = np.histogram2d(x_values, y_values, bins = config.PLOT_DENSITY_BINS)
+	# Empty bins are left transparent
+	ax.imshow(np.ma.masked_equal(counts.T, 0), origin = 'lower', aspect = 'auto',
+			  extent = (x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+			  cmap = 'Greys', interpolation = 'nearest')
+
+def plot_fit(calc_input, x_values, function_values, save_plot_name = None, plot = False,
+			 plot_format = config.DEFAULT_PLOT_FORMAT):
+	"""
+	plots the data points of calc_input and the fitted function's values
+	above config.PLOT_DECIMATION_THRESHOLD points the data is plotted
+	as its density with the error bars of a decimated subset
+	the error bars are rasterized inside vector output
+	if save_plot_name is not None saves plot to current directory
+	with save_plot_name
+	if plot is true shows plot on screen
+	"""
+	figure = get_figure()
+	ax = figure.add_subplot()
+	points_amount = len(calc_input.x_values)
+	large_data = points_amount > config.PLOT_DECIMATION_THRESHOLD
+	if large_data:
+		plot_density(ax, calc_input.x_values, calc_input.y_values)
+	indexes = decimate_points(calc_input.x_values, config.PLOT_DECIMATION_THRESHOLD)
+	ax.errorbar(calc_input.x_values[indexes], calc_input.y_values[indexes],
+				xerr = calc_input.x_uncertainties[indexes],
+				yerr = calc_input.y_uncertainties[indexes], fmt='+',
+				ecolor='b', rasterized = large_data)
+	# zorder so it will be infront, like in the examples not like the instructions
+	ax.plot(x_values, function_values, color = 'r', zorder=32)
+	ax.set_xlabel(calc_input.x_axis_title)
+	ax.set_ylabel(calc_input.y_axis_title)
+	finish_plot(figure, save_plot_name = save_plot_name, plot = plot, plot_format = plot_format)
+
+def plot_a_chosing(a_values, chi_values, y_label, save_plot_name = None, plot = False,
+				   plot_format = config.DEFAULT_PLOT_FORMAT):
+	"""
+	plots the chi_values as a function of a_values
+	if save_plot_name is not None saves plot to current directory
+	with save_plot_name
+	if plot is true shows plot on screen
+	"""
+	figure = get_figure()
+	ax = figure.add_subplot()
+	ax.plot(a_values, chi_values, color = 'b')
+	ax.set_xlabel(config.A_PLOT_X_LABEL)
+	ax.set_ylabel(y_label)
+	# bbox_inches so the y label won't be cut out of the svg
+	finish_plot(figure, save_plot_name = save_plot_name, plot = plot, plot_format = plot_format,
+				bbox_inches = 'tight')
+
+def plot_chi_contours(a_values, b_values, profile_a, profile_b, contours, delta_chi_levels,
+					  best_a_index, best_b_index, save_plot_name = None, plot = False,
+					  plot_format = config.DEFAULT_PLOT_FORMAT):
+	"""
+	plots the chi contours of every delta chi level around the best
+	(a, b) cell, and the profile chi of a and of b next to them
+	contours - the (a, b) point arrays of every level, see ChiSurface.calculate_contours
+	if save_plot_name is not None saves plot to current directory
+	with save_plot_name
+	if plot is true shows plot on screen
+	"""
+	figure = get_figure()
+	contours_ax, profile_a_ax, profile_b_ax = figure.subplots(1, 3)
+	figure.set_size_inches(config.CONTOUR_PLOT_SIZE)
+	for level_index, (delta_chi, level_contours) in enumerate(zip(delta_chi_levels, contours)):
+		color = 'C{0}'.format(level_index)
+		for line_index, line in enumerate(level_contours):
+			contours_ax.plot(line[:, 0], line[:, 1], color = color,
+							 label = config.CONTOUR_LABEL_FORMAT.format(delta_chi) if line_index == 0 else None)
+	contours_ax.plot(a_values[best_a_index], b_values[best_b_index], '+', color = 'r')
+	contours_ax.set_xlabel(config.A_PLOT_X_LABEL)
+	contours_ax.set_ylabel(config.B_PLOT_LABEL)
+	contours_ax.legend()
+	for ax, values, profile, label in ((profile_a_ax, a_values, profile_a, config.A_PLOT_X_LABEL),
+									   (profile_b_ax, b_values, profile_b, config.B_PLOT_LABEL)):
+		ax.plot(values, profile, color = 'b')
+		ax.set_xlabel(label)
+		ax.set_ylabel(config.PROFILE_Y_LABEL)
+	figure.tight_layout()
+	finish_plot(figure, save_plot_name = save_plot_name, plot = plot, plot_format = plot_format,
+				bbox_inches = 'tight')
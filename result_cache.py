@@ -0,0 +1,156 @@
+import os
+import glob
+import json
+import config
+import shutil
+import hashlib
+import tempfile
+
+class ResultCache(object):
+	"""
+	An on disk cache of fit results, keyed by the hash of the input
+	file's content and the fit options, so a repeated fit of the same
+	file is not parsed and fitted again
+	Every entry is a directory holding config.RESULT_CACHE_ENTRY_FILE_NAME,
+	the printed output and the result values, and the entry's plot files
+	Above max_size bytes the least recently used entries are removed,
+	an entry is used when it is stored or loaded
+	The keys include the hash of the fitting code, so a changed fit
+	never loads the results of the code before it
+	"""
+	def __init__(self, cache_directory = config.RESULT_CACHE_DIRECTORY,
+				 max_size = config.RESULT_CACHE_MAX_SIZE):
+		super(ResultCache, self).__init__()
+		self.cache_directory = os.path.expanduser(cache_directory)
+		self.max_size = max_size
+		self.code_hash = create_code_hash()
+
+	def create_key(self, file_path, options):
+		"""
+		Creates the key of fitting file_path with options,
+		a dictionary of every option which changes the result
+		"""
+		key_hash = hashlib.sha256()
+		with open(file_path, 'rb') as f:
+			for chunk in iter(lambda: f.read(config.RESULT_CACHE_READ_SIZE), b''):
+				key_hash.update(chunk)
+		key_hash.update(json.dumps(options, sort_keys = True).encode())
+		key_hash.update(str(config.RESULT_CACHE_VERSION).encode())
+		key_hash.update(self.code_hash.encode())
+		return key_hash.hexdigest()
+
+	def load(self, key):
+		"""
+		Loads the entry of key, returns none if there is none
+		the entry is a dictionary of the stored output, result and
+		plot names, see self.store
+		"""
+		entry_directory = os.path.join(self.cache_directory, key)
+		try:
+			with open(os.path.join(entry_directory, config.RESULT_CACHE_ENTRY_FILE_NAME), 'r') as f:
+				entry = json.load(f)
+			# Marks the entry as recently used
+			os.utime(entry_directory)
+		except (OSError, ValueError) as e:
+			return None
+
+		entry['directory'] = entry_directory
+		return entry
+
+	def restore_plot(self, entry, plot_name, destination_path):
+		"""
+		Copies the entry's plot_name plot to destination_path
+		"""
+		shutil.copyfile(os.path.join(entry['directory'], plot_name), destination_path)
+
+	def store(self, key, output = None, result = None, plot_paths = None):
+		"""
+		Stores the entry of key, then removes the least recently used
+		entries above self.max_size
+		Caching is best effort, if the cache directory is not writable
+		the entry is not stored and the fit is not affected
+		output - the printed output of the fit
+		result - a json serializable dictionary of the result values
+		plot_paths - a dictionary of the name to store every plot file
+					 of the fit by, and its path
+		"""
+		plot_paths = plot_paths if plot_paths is not None else {}
+		try:
+			os.makedirs(self.cache_directory, exist_ok = True)
+			# The entry is written aside and renamed into place, so a concurrent
+			# load never reads a partial entry
+			temporary_directory = tempfile.mkdtemp(prefix = '.', dir = self.cache_directory)
+		except OSError as e:
+			return None
+
+		try:
+			for plot_name, plot_path in plot_paths.items():
+				shutil.copyfile(plot_path, os.path.join(temporary_directory, plot_name))
+			with open(os.path.join(temporary_directory, config.RESULT_CACHE_ENTRY_FILE_NAME), 'w') as f:
+				json.dump({'output': output, 'result': result, 'plots': sorted(plot_paths)}, f)
+			os.rename(temporary_directory, os.path.join(self.cache_directory, key))
+		except OSError as e:
+			# Another process stored the same entry first, or the write failed
+			shutil.rmtree(temporary_directory, ignore_errors = True)
+
+		self.evict()
+
+	def evict(self):
+		"""
+		Removes the least recently used entries until the
+		cache's size is not above self.max_size
+		best effort like self.store, errors leave the entries as they are
+		"""
+		try:
+			entry_names = os.listdir(self.cache_directory)
+		except OSError as e:
+			return None
+
+		entries = []
+		for entry_name in entry_names:
+			if entry_name.startswith('.'):
+				continue
+			entry_directory = os.path.join(self.cache_directory, entry_name)
+			try:
+				entry_size = sum(os.path.getsize(os.path.join(entry_directory, file_name)) \
+								 for file_name in os.listdir(entry_directory))
+				entries.append((os.path.getmtime(entry_directory), entry_size, entry_directory))
+			except OSError as e:
+				# Removed by another process meanwhile
+				continue
+
+		cache_size = sum(entry_size for used_time, entry_size, entry_directory in entries)
+		for used_time, entry_size, entry_directory in sorted(entries):
+			if cache_size <= self.max_size:
+				break
+			shutil.rmtree(entry_directory, ignore_errors = True)
+			cache_size -= entry_size
+
+def create_code_hash():
+	"""
+	Creates the hash of the source of every module next to this one,
+	the code which fits and prints the cached results
+	"""
+	code_hash = hashlib.sha256()
+	for file_path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+		code_hash.update(os.path.basename(file_path).encode())
+		with open(file_path, 'rb') as f:
+			code_hash.update(f.read())
+	return code_hash.hexdigest()
+
+class OutputRecorder(object):
+	"""Writes text to a stream and records it, to cache printed output"""
+	def __init__(self, stream):
+		super(OutputRecorder, self).__init__()
+		self.stream = stream
+		self.parts = []
+
+	def write(self, text):
+		self.stream.write(text)
+		self.parts.append(text)
+
+	def flush(self):
+		self.stream.flush()
+
+	def getvalue(self):
+		return ''.join(self.parts)
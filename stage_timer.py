@@ -0,0 +1,63 @@
+import json
+import time
+import contextlib
+import tracemalloc
+
+class StageTimer(object):
+	"""
+	Records the wall time, cpu time and allocated memory of every stage
+	of a run, and counters like the amount of parsed rows
+	The memory is traced with tracemalloc only if trace_memory is true,
+	since tracing slows the run
+	"""
+	def __init__(self, trace_memory = False):
+		super(StageTimer, self).__init__()
+		self.trace_memory = trace_memory
+		self.stages = []
+		self.counters = {}
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		"""
+		Records the code run inside the with block as the stage name
+		stages should not be nested, the memory peak is reset by every stage
+		"""
+		if self.trace_memory:
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+			tracemalloc.reset_peak()
+			start_memory, _ = tracemalloc.get_traced_memory()
+		start_wall_time = time.perf_counter()
+		start_cpu_time = time.process_time()
+		try:
+			yield
+		finally:
+			stage = {'name': name,
+					 'wall_seconds': time.perf_counter() - start_wall_time,
+					 'cpu_seconds': time.process_time() - start_cpu_time}
+			if self.trace_memory:
+				end_memory, peak_memory = tracemalloc.get_traced_memory()
+				# The memory still allocated after the stage, and its peak
+				stage['allocated_memory'] = end_memory - start_memory
+				stage['peak_memory'] = peak_memory - start_memory
+			self.stages.append(stage)
+
+	def add_counter(self, name, amount):
+		self.counters[name] = self.counters.get(name, 0) + amount
+
+	def create_report(self):
+		"""
+		Creates the timing report, the stages in the order they ran
+		their totals, and the counters
+		"""
+		return {'stages': self.stages,
+				'total_wall_seconds': sum(stage['wall_seconds'] for stage in self.stages),
+				'total_cpu_seconds': sum(stage['cpu_seconds'] for stage in self.stages),
+				'counters': self.counters}
+
+	def write_report(self, file_path):
+		"""
+		Writes the timing report as json to file_path
+		"""
+		with open(file_path, 'w') as f:
+			json.dump(self.create_report(), f, indent = 1)
@@ -0,0 +1,185 @@
+import os
+import utils
+import config
+from lab_fit_exception import LabFitException
+from input_parser import InputParser
+from calc_input import create_data_buffer
+from stage_timer import StageTimer
+
+class StreamingInputParser(InputParser):
+	"""
+	Parses an input file in a single pass without holding all of its text
+	The file type is decided by the first non empty row, column type
+	data rows are converted in chunks straight into one float array,
+	so the peak memory is close to the size of the final data
+	"""
+	def __init__(self, file_path = None, contains_ab_values = False,
+				 chunk_rows = config.STREAMING_CHUNK_ROWS, dtype = config.DEFAULT_DATA_DTYPE):
+		super(StreamingInputParser, self).__init__(file_path = file_path,
+												   contains_ab_values = contains_ab_values,
+												   dtype = dtype)
+		self.chunk_rows = chunk_rows
+
+	def read_data_lines(self, f):
+		"""
+		Yields the non empty rows of the file f without their line break
+		and their line numbers, starting at 1
+		"""
+		for line_number, row in enumerate(f, 1):
+			row = row.rstrip('\r\n')
+			if len(row) != 0:
+				yield line_number, row
+
+	def stream_data_column_type(self, title_row, data_lines):
+		"""
+		Parses the column type data rows following title_row
+		and insert the data into self.input
+		returns the rows after the data, holding the axis names and a b values
+		"""
+		column_indexes = self.find_column_indexes(title_row.lower().split())
+		data = None
+		rows_amount = 0
+		chunk = []
+		chunk_line_numbers = []
+		trailing_lines = []
+		for line_number, row in data_lines:
+			# Means end of input
+			if self.check_if_data_end(row):
+				trailing_lines.append(row)
+				break
+			chunk.append(row)
+			chunk_line_numbers.append(line_number)
+			if len(chunk) == self.chunk_rows:
+				data = self.insert_chunk(data, rows_amount, chunk, chunk_line_numbers, column_indexes)
+				rows_amount += len(chunk)
+				chunk = []
+				chunk_line_numbers = []
+
+		if len(chunk) != 0 or data is None:
+			data = self.insert_chunk(data, rows_amount, chunk, chunk_line_numbers, column_indexes)
+			rows_amount += len(chunk)
+
+		# The rest of the file is only the axis names and a b values
+		trailing_lines.extend(row for line_number, row in data_lines)
+		# The spare rows are at the end of every column, so slicing
+		# them off keeps the columns contiguous without copying the data
+		self.input.set_data(data[:rows_amount])
+		return trailing_lines
+
+	def insert_chunk(self, data, rows_amount, chunk, chunk_line_numbers, column_indexes):
+		"""
+		Converts the chunk's rows to floats and inserts them to the data
+		buffer after rows_amount rows, the buffer grows when it is full
+		the first chunk allocates the buffer by the estimated amount of file rows
+		chunk_line_numbers - the file line number of every chunk row
+		column_indexes - the file column of x, dx, y and dy
+		returns the data buffer
+		"""
+		chunk_data = utils.convert_rows_to_floats(chunk, config.MAX_DATA_TYPE_AMOUNT,
+												  chunk_line_numbers)
+
+		needed_rows = rows_amount + len(chunk_data)
+		if data is None:
+			data = create_data_buffer(max(needed_rows, self.estimate_rows_amount(chunk)), self.dtype)
+		elif needed_rows > len(data):
+			grown_data = create_data_buffer(max(needed_rows, int(len(data) * config.STREAMING_GROWTH_FACTOR)),
+											self.dtype)
+			grown_data[:rows_amount] = data[:rows_amount]
+			data = grown_data
+
+		self.insert_rows(data, rows_amount, chunk_data, column_indexes)
+		return data
+
+	def estimate_rows_amount(self, chunk):
+		"""
+		Estimates the amount of data rows in the file
+		by the average length of the chunk's rows
+		"""
+		if len(chunk) == 0:
+			return 0
+		# Every row is followed by at least one line break
+		row_length = sum(len(row) + 1 for row in chunk) / len(chunk)
+		return int(os.path.getsize(self.file_path) / row_length) + 1
+
+	def stream_data_row_type(self, first_row, data_lines):
+		"""
+		Parses the row type data rows, starting with first_row
+		and insert the data into self.input
+		first_row - the first (line number, row)
+		returns the rows after the data, holding the axis names and a b values
+		"""
+		line_number, row = first_row
+		for row_index in range(config.MAX_DATA_TYPE_AMOUNT):
+			if row is None:
+				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+													   config.NOT_ENOUGH_DATA_ROWS))
+			if not self.check_if_titles(row.lower().split()[:1]):
+				self.check_enough_data_rows(data_lines, config.MAX_DATA_TYPE_AMOUNT - row_index - 1)
+				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+													   config.UNKNOWN_FILE_TYPE))
+			self.parse_data_row(row, line_number)
+			line_number, row = next(data_lines, (None, None))
+		self.finish_data_rows()
+
+		trailing_lines = [row] if row is not None else []
+		trailing_lines.extend(row for line_number, row in data_lines)
+		return trailing_lines
+
+	def check_enough_data_rows(self, data_lines, rows_amount):
+		"""
+		Checks that data_lines has at least rows_amount more rows
+		"""
+		for row_index in range(rows_amount):
+			if next(data_lines, None) is None:
+				raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+													   config.NOT_ENOUGH_DATA_ROWS))
+
+	def start(self, timer = None):
+		"""
+		Parses the input file and returns the CalcInput
+		timer - a StageTimer recording the parse and validate stages,
+				the file is read while it is parsed
+		"""
+		# Binary input files are memory mapped, there is nothing to stream
+		if self.check_if_binary_type():
+			return super(StreamingInputParser, self).start(timer)
+
+		timer = timer if timer is not None else StageTimer()
+		with timer.stage('parse'):
+			with open(self.file_path, 'r') as f:
+				data_lines = self.read_data_lines(f)
+				first_row = next(data_lines, None)
+				# Checks if input data is empty
+				if first_row is None:
+					raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX,
+														   config.EMPTY_INPUT_FILE))
+				if self.check_if_titles(first_row[1].lower().split()):
+					trailing_lines = self.stream_data_column_type(first_row[1], data_lines)
+				else:
+					trailing_lines = self.stream_data_row_type(first_row, data_lines)
+
+			# Retrieves the x and y axis names
+			self.parse_x_y_axis_names(trailing_lines, 0)
+			# Retrieves the model, if the file chose one
+			self.parse_model(trailing_lines, 0)
+			# Retrieves the a and b values
+			self.parse_a_b_values(trailing_lines, 0)
+		with timer.stage('validate'):
+			self.is_valid()
+		timer.add_counter('rows_parsed', len(self.input.x_values))
+		return self.input
+
+def create_input_parser(file_path, contains_ab_values = False, streaming = None,
+						dtype = config.DEFAULT_DATA_DTYPE):
+	"""
+	Creates the input parser of file_path
+	streaming - if true a StreamingInputParser, if false an InputParser,
+				if none decides by config.STREAMING_FILE_SIZE_THRESHOLD
+	dtype - one of config.DATA_DTYPES, the float type of the parsed data
+	"""
+	if streaming is None:
+		streaming = os.path.getsize(file_path) >= config.STREAMING_FILE_SIZE_THRESHOLD
+	if streaming:
+		return StreamingInputParser(file_path = file_path, contains_ab_values = contains_ab_values,
+									dtype = dtype)
+	return InputParser(file_path = file_path, contains_ab_values = contains_ab_values, dtype = dtype)
@@ -1,31 +1,72 @@
-import copy
 import config
+import numpy as np
 from lab_fit_exception import LabFitException
 
-def convert_str_list_to_floats(str_list):
+def create_input_error(message, line_number = None):
+	"""
+	Creates the input file LabFitException of message
+	line_number - the offending line of the input file, if known
+	"""
+	error_message = "{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, message)
+	if line_number is not None:
+		error_message = "{0} {1}".format(error_message, config.LINE_NUMBER_FORMAT.format(line_number))
+	return LabFitException(error_message)
+
+def convert_str_list_to_floats(str_list, line_number = None):
+	"""
+	Converts a list of strings into a float array
+	line_number - the input file line of the strings, for the error message
+	"""
 	try:
-		return [float(i) for i in str_list]
+		return np.array(str_list, dtype = np.float64)
 	except ValueError as e:
-		raise LabFitException("{0} {1}".format(config.INPUT_EXCEPTION_PREFIX, 
-													   config.INVALID_DATA_VALUE))
+		raise create_input_error(config.INVALID_DATA_VALUE, line_number)
 
-def delete_empty_rows(dr, only_begining = False):
+def convert_rows_to_floats(rows, columns_amount, line_numbers = None):
 	"""
-	Deletes empty rows from a list of strings
-	only_begining flag is to erase only the row at the begining
+	Converts rows of columns_amount whitespace separated floats
+	into a (len(rows), columns_amount) float array in one bulk parse
+	line_numbers - the input file line of every row, for the error message
 	"""
-	data_lines = copy.deepcopy(dr)
+	if len(rows) == 0:
+		return np.empty((0, columns_amount))
 
-	while len(data_lines[0]) == 0:
-		data_lines = data_lines[1:]
+	try:
+		data = np.loadtxt(rows, dtype = np.float64, comments = None, ndmin = 2)
+	except ValueError as e:
+		data = None
 
-	if only_begining:
-		return data_lines
+	# loadtxt skips blank rows, which are not valid data rows
+	if data is None or data.shape != (len(rows), columns_amount):
+		raise find_rows_error(rows, columns_amount, line_numbers)
 
-	fixed_data_rows = []
-	for row_index in range(len(data_lines)):
-		row = data_lines[row_index]
-		if len(row) != 0:
-			fixed_data_rows.append(row)
+	return data
 
-	return fixed_data_rows 
\ No newline at end of file
+def find_rows_error(rows, columns_amount, line_numbers = None):
+	"""
+	Finds the first row that can not be converted to columns_amount floats
+	the slow path of convert_rows_to_floats, used only for the error message
+	every row is converted by np.loadtxt like the bulk parse, so the row
+	it failed on is always found
+	returns the LabFitException of the row
+	"""
+	for row_index, row in enumerate(rows):
+		line_number = line_numbers[row_index] if line_numbers is not None else None
+		data_line_columns = row.split()
+		# Checks for unified amount of data
+		if len(data_line_columns) != columns_amount:
+			return create_input_error(config.DIFFERENT_DATA_AMOUNTS, line_number)
+		try:
+			np.loadtxt([row], dtype = np.float64, comments = None)
+		except ValueError as e:
+			return create_input_error(config.INVALID_DATA_VALUE, line_number)
+
+	return create_input_error(config.INVALID_DATA_VALUE)
+
+def index_non_empty_rows(data_lines):
+	"""
+	Finds the non empty rows of a list of strings
+	returns the non empty rows and their line numbers, starting at 1
+	"""
+	line_numbers = [row_index + 1 for row_index, row in enumerate(data_lines) if len(row) != 0]
+	return [data_lines[line_number - 1] for line_number in line_numbers], line_numbers
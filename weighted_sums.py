@@ -0,0 +1,350 @@
+import config
+import numpy as np
+
+class WeightedSums(object):
+	"""
+	Holds the weighted sums of the data points, the weights are 1 / dy^2
+	The linear fit's a and b values and their uncertainties
+	are calculated from the sums only, without another pass over the data
+	"""
+	def __init__(self):
+		super(WeightedSums, self).__init__()
+		self.count = 0
+		self.sum_weights = 0.0
+		self.sum_weighted_x = 0.0
+		self.sum_weighted_y = 0.0
+		self.sum_weighted_square_x = 0.0
+		self.sum_weighted_xy = 0.0
+		self.sum_weighted_square_y = 0.0
+		self.sum_weighted_square_uncertainty = 0.0
+
+	def add_arrays(self, x_values, y_values, y_uncertainties):
+		"""
+		Adds the data points to the sums in a single pass
+		only two data sized temporary arrays are allocated
+		"""
+		square_uncertainties = np.square(y_uncertainties)
+		weights = np.reciprocal(square_uncertainties)
+		self.sum_weighted_square_uncertainty += np.dot(weights, square_uncertainties)
+		# Reuses the square uncertainties array
+		weighted_x = np.multiply(weights, x_values, out = square_uncertainties)
+		self.count += len(x_values)
+		self.sum_weights += np.sum(weights)
+		self.sum_weighted_x += np.sum(weighted_x)
+		self.sum_weighted_y += np.dot(weights, y_values)
+		self.sum_weighted_square_x += np.dot(weighted_x, x_values)
+		self.sum_weighted_xy += np.dot(weighted_x, y_values)
+		# Reuses the weights array
+		weighted_y = np.multiply(weights, y_values, out = weights)
+		self.sum_weighted_square_y += np.dot(weighted_y, y_values)
+
+	def add_replica_arrays(self, x_samples, y_samples, y_uncertainties):
+		"""
+		Adds data sets of the same y uncertainties, every row of
+		x_samples and y_samples is a data set, so every sum becomes
+		an array of the sums of every data set
+		The sums are matrix vector products, without a loop over the data sets
+		"""
+		square_uncertainties = np.square(y_uncertainties)
+		weights = np.reciprocal(square_uncertainties)
+		self.count += x_samples.shape[1]
+		self.sum_weights += np.sum(weights)
+		self.sum_weighted_square_uncertainty += np.dot(weights, square_uncertainties)
+		self.sum_weighted_x += np.dot(x_samples, weights)
+		self.sum_weighted_y += np.dot(y_samples, weights)
+		# A single data sets sized temporary array is reused for the products
+		products = np.square(y_samples)
+		self.sum_weighted_square_y += np.dot(products, weights)
+		np.square(x_samples, out = products)
+		self.sum_weighted_square_x += np.dot(products, weights)
+		np.multiply(x_samples, y_samples, out = products)
+		self.sum_weighted_xy += np.dot(products, weights)
+
+	def add_point(self, x_value, y_value, y_uncertainty, sign = 1):
+		"""
+		Adds a single data point to the sums in O(1)
+		sign - 1 to add the point, -1 to remove a point added before
+		"""
+		square_uncertainty = y_uncertainty * y_uncertainty
+		weight = 1 / square_uncertainty
+		weighted_x = weight * x_value
+		self.count += sign
+		self.sum_weights += sign * weight
+		self.sum_weighted_x += sign * weighted_x
+		self.sum_weighted_y += sign * weight * y_value
+		self.sum_weighted_square_x += sign * weighted_x * x_value
+		self.sum_weighted_xy += sign * weighted_x * y_value
+		self.sum_weighted_square_y += sign * weight * y_value * y_value
+		self.sum_weighted_square_uncertainty += sign * weight * square_uncertainty
+
+	def remove_point(self, x_value, y_value, y_uncertainty):
+		"""
+		Removes a data point that was added before from the sums in O(1)
+		"""
+		self.add_point(x_value, y_value, y_uncertainty, sign = -1)
+
+	def calculate_chi(self, a_value, b_value):
+		"""
+		Calculates the chi value of a and b from the sums, see ChiEvaluator
+		"""
+		return ChiEvaluator(self).calculate_chi(a_value, b_value)
+
+	def create_centered_sums(self):
+		"""
+		Creates the CenteredWeightedSums of the same points from the sums
+		"""
+		x_mean = self.sum_weighted_x / self.sum_weights
+		y_mean = self.sum_weighted_y / self.sum_weights
+		centered_sums = CenteredWeightedSums()
+		centered_sums.merge(self.count, self.sum_weights, x_mean, y_mean,
+							self.sum_weighted_square_x - x_mean * self.sum_weighted_x,
+							self.sum_weighted_xy - x_mean * self.sum_weighted_y,
+							self.sum_weighted_square_y - y_mean * self.sum_weighted_y,
+							self.sum_weighted_square_uncertainty)
+		return centered_sums
+
+	def calculate_linear_a_b_values(self):
+		"""
+		Calculates the linear fit's values from the weighted means
+		returns a_value, a_uncertainty, b_value, b_uncertainty
+		"""
+		mean_xy = self.sum_weighted_xy / self.sum_weights
+		x_mean = self.sum_weighted_x / self.sum_weights
+		y_mean = self.sum_weighted_y / self.sum_weights
+		mean_square_x = self.sum_weighted_square_x / self.sum_weights
+		square_x_mean = np.power(x_mean, 2)
+		mean_square_y_uncertainty = self.sum_weighted_square_uncertainty / self.sum_weights
+
+		a_value = (mean_xy - (x_mean * y_mean)) / (mean_square_x - square_x_mean)
+		a_uncertainty = mean_square_y_uncertainty / \
+						(self.count * (mean_square_x - square_x_mean))
+		b_value = y_mean - (a_value * x_mean)
+		b_uncertainty = (mean_square_y_uncertainty * mean_square_x) / \
+						(self.count * (mean_square_x - square_x_mean))
+
+		return a_value, np.power(a_uncertainty, 0.5), b_value, np.power(b_uncertainty, 0.5)
+
+class CenteredWeightedSums(object):
+	"""
+	Same as WeightedSums, but holds the weighted means of x and y and the
+	weighted sums of the products of their deviations from the means
+	The raw sums lose the differences between the data points when the
+	x or y values are far from 0, the centered sums do not
+	Points are added with weighted Welford updates, arrays in blocks
+	of config.STABLE_SUMS_BLOCK_ROWS rows merged like parallel variances,
+	so it is a single pass over the data and the sums can be streamed
+	The means are kept relative to the first point, so their many small
+	updates do not round to the digits of a large mean
+	"""
+	def __init__(self):
+		super(CenteredWeightedSums, self).__init__()
+		self.count = 0
+		self.sum_weights = 0.0
+		self.x_reference = 0.0
+		self.y_reference = 0.0
+		# Relative to the reference x and y
+		self.x_mean = 0.0
+		self.y_mean = 0.0
+		self.sum_weighted_square_dx = 0.0
+		self.sum_weighted_dxdy = 0.0
+		self.sum_weighted_square_dy = 0.0
+		self.sum_weighted_square_uncertainty = 0.0
+
+	def add_arrays(self, x_values, y_values, y_uncertainties):
+		"""
+		Adds the data points to the sums, one block at a time
+		"""
+		for block_start in range(0, len(x_values), config.STABLE_SUMS_BLOCK_ROWS):
+			block_end = block_start + config.STABLE_SUMS_BLOCK_ROWS
+			self.add_block(x_values[block_start:block_end], y_values[block_start:block_end],
+						   y_uncertainties[block_start:block_end])
+
+	def add_block(self, x_values, y_values, y_uncertainties):
+		"""
+		Calculates the centered sums of a block which fits the cpu cache,
+		and merges them into the sums
+		"""
+		if self.count == 0:
+			self.x_reference = x_values[0]
+			self.y_reference = y_values[0]
+		square_uncertainties = np.square(y_uncertainties)
+		weights = np.reciprocal(square_uncertainties)
+		block_weights = np.sum(weights)
+		block_x_mean = np.dot(weights, x_values) / block_weights
+		block_y_mean = np.dot(weights, y_values) / block_weights
+		x_deviations = x_values - block_x_mean
+		y_deviations = y_values - block_y_mean
+		# The deviations' own weighted mean is the rounding error of the
+		# block's means, it is removed from the sums (corrected two pass)
+		x_shift = np.dot(weights, x_deviations) / block_weights
+		y_shift = np.dot(weights, y_deviations) / block_weights
+		block_square_uncertainty = np.dot(weights, square_uncertainties)
+		weighted_x_deviations = np.multiply(weights, x_deviations, out = square_uncertainties)
+		block_square_dx = np.dot(weighted_x_deviations, x_deviations) - block_weights * x_shift * x_shift
+		block_dxdy = np.dot(weighted_x_deviations, y_deviations) - block_weights * x_shift * y_shift
+		block_square_dy = np.dot(weights * y_deviations, y_deviations) - block_weights * y_shift * y_shift
+		self.merge(len(x_values), block_weights, block_x_mean - self.x_reference + x_shift,
+				   block_y_mean - self.y_reference + y_shift, block_square_dx, block_dxdy,
+				   block_square_dy, block_square_uncertainty)
+
+	def add_replica_arrays(self, x_samples, y_samples, y_uncertainties):
+		"""
+		Same as WeightedSums.add_replica_arrays, every sum becomes
+		an array of the centered sums of every data set
+		The deviations are calculated in place, so x_samples and y_samples
+		are changed, and a single data sets sized temporary array is used
+		"""
+		if self.count == 0:
+			self.x_reference = x_samples[0, 0]
+			self.y_reference = y_samples[0, 0]
+		square_uncertainties = np.square(y_uncertainties)
+		weights = np.reciprocal(square_uncertainties)
+		sum_weights = np.sum(weights)
+		x_means = np.dot(x_samples, weights) / sum_weights
+		y_means = np.dot(y_samples, weights) / sum_weights
+		x_samples -= x_means[:, np.newaxis]
+		y_samples -= y_means[:, np.newaxis]
+		# The corrected two pass of every data set, see self.add_block
+		x_shifts = np.dot(x_samples, weights) / sum_weights
+		y_shifts = np.dot(y_samples, weights) / sum_weights
+		products = np.square(y_samples)
+		square_dy = np.dot(products, weights) - sum_weights * y_shifts * y_shifts
+		np.square(x_samples, out = products)
+		square_dx = np.dot(products, weights) - sum_weights * x_shifts * x_shifts
+		np.multiply(x_samples, y_samples, out = products)
+		dxdy = np.dot(products, weights) - sum_weights * x_shifts * y_shifts
+		self.merge(x_samples.shape[1], sum_weights, x_means - self.x_reference + x_shifts,
+				   y_means - self.y_reference + y_shifts, square_dx, dxdy, square_dy,
+				   np.dot(weights, square_uncertainties))
+
+	def merge(self, count, sum_weights, x_mean, y_mean, sum_weighted_square_dx,
+			  sum_weighted_dxdy, sum_weighted_square_dy, sum_weighted_square_uncertainty):
+		"""
+		Merges the centered sums of other points into the sums
+		x_mean, y_mean - the other points' means relative to the reference
+		"""
+		total_weights = self.sum_weights + sum_weights
+		x_difference = x_mean - self.x_mean
+		y_difference = y_mean - self.y_mean
+		# The spread between the two groups' means
+		spread_weight = self.sum_weights * sum_weights / total_weights
+		self.sum_weighted_square_dx += sum_weighted_square_dx + x_difference * x_difference * spread_weight
+		self.sum_weighted_dxdy += sum_weighted_dxdy + x_difference * y_difference * spread_weight
+		self.sum_weighted_square_dy += sum_weighted_square_dy + y_difference * y_difference * spread_weight
+		self.x_mean += x_difference * sum_weights / total_weights
+		self.y_mean += y_difference * sum_weights / total_weights
+		self.sum_weights = total_weights
+		self.count += count
+		self.sum_weighted_square_uncertainty += sum_weighted_square_uncertainty
+
+	def add_point(self, x_value, y_value, y_uncertainty, sign = 1):
+		"""
+		Adds a single data point to the sums in O(1), a weighted Welford update
+		sign - 1 to add the point, -1 to remove a point added before
+		"""
+		if self.count == 0:
+			self.x_reference = x_value
+			self.y_reference = y_value
+		x_value -= self.x_reference
+		y_value -= self.y_reference
+		square_uncertainty = y_uncertainty * y_uncertainty
+		weight = sign / square_uncertainty
+		total_weights = self.sum_weights + weight
+		self.count += sign
+		self.sum_weighted_square_uncertainty += weight * square_uncertainty
+		if self.count == 0:
+			# The last point was removed
+			self.__init__()
+			return None
+
+		x_difference = x_value - self.x_mean
+		y_difference = y_value - self.y_mean
+		self.x_mean += x_difference * weight / total_weights
+		self.y_mean += y_difference * weight / total_weights
+		self.sum_weighted_square_dx += weight * x_difference * (x_value - self.x_mean)
+		self.sum_weighted_dxdy += weight * x_difference * (y_value - self.y_mean)
+		self.sum_weighted_square_dy += weight * y_difference * (y_value - self.y_mean)
+		self.sum_weights = total_weights
+
+	def remove_point(self, x_value, y_value, y_uncertainty):
+		"""
+		Removes a data point that was added before from the sums in O(1)
+		"""
+		self.add_point(x_value, y_value, y_uncertainty, sign = -1)
+
+	def calculate_chi(self, a_values, b_values):
+		"""
+		Calculates the chi values of a_values and b_values from the sums, see ChiEvaluator
+		"""
+		return ChiEvaluator(self).calculate_chi(a_values, b_values)
+
+	def create_centered_sums(self):
+		return self
+
+	def calculate_linear_a_b_values(self):
+		"""
+		Calculates the linear fit's values from the centered sums,
+		the same values as WeightedSums.calculate_linear_a_b_values
+		returns a_value, a_uncertainty, b_value, b_uncertainty
+		"""
+		# The weighted variance of x, mean_square_x - square_x_mean
+		x_variance = self.sum_weighted_square_dx / self.sum_weights
+		x_mean = self.x_reference + self.x_mean
+		mean_square_x = x_variance + np.power(x_mean, 2)
+		mean_square_y_uncertainty = self.sum_weighted_square_uncertainty / self.sum_weights
+
+		a_value = self.sum_weighted_dxdy / self.sum_weighted_square_dx
+		a_uncertainty = mean_square_y_uncertainty / (self.count * x_variance)
+		b_value = self.y_reference + self.y_mean - (a_value * x_mean)
+		b_uncertainty = (mean_square_y_uncertainty * mean_square_x) / (self.count * x_variance)
+
+		return a_value, np.power(a_uncertainty, 0.5), b_value, np.power(b_uncertainty, 0.5)
+
+class ChiEvaluator(object):
+	"""
+	Evaluates the chi value sum(((y - (a * x + b)) / dy)^2) of any a and b
+	in O(1), independent of the amount of data points
+	The chi is a quadratic in a and b, precomputed from the centered sums
+	so it keeps its digits when the data is far from 0, the deviations'
+	cross terms are 0 so it is
+	sum_square_dy + a * (a * sum_square_dx - 2 * sum_dxdy) + sum_weights * (y_mean - a * x_mean - b)^2
+	"""
+	def __init__(self, weighted_sums):
+		super(ChiEvaluator, self).__init__()
+		centered_sums = weighted_sums.create_centered_sums()
+		self.sum_weights = centered_sums.sum_weights
+		self.x_reference = centered_sums.x_reference
+		self.y_reference = centered_sums.y_reference
+		self.x_mean = centered_sums.x_mean
+		self.y_mean = centered_sums.y_mean
+		self.square_dx_coefficient = centered_sums.sum_weighted_square_dx
+		self.dxdy_coefficient = -2 * centered_sums.sum_weighted_dxdy
+		self.constant = centered_sums.sum_weighted_square_dy
+
+	def calculate_chi(self, a_values, b_values):
+		"""
+		Calculates the chi values of a_values and b_values
+		a_values, b_values - numbers or arrays, arrays are broadcast together
+		"""
+		mean_residual = self.y_mean - a_values * self.x_mean + \
+						(self.y_reference - a_values * self.x_reference - b_values)
+		return self.constant + a_values * (self.dxdy_coefficient + self.square_dx_coefficient * a_values) + \
+			   self.sum_weights * mean_residual * mean_residual
+
+def create_weighted_sums(x_values, y_values, y_uncertainties, stable = False):
+	"""
+	Creates the WeightedSums of the data points
+	if stable is true the CenteredWeightedSums, for data far from 0
+	"""
+	weighted_sums = CenteredWeightedSums() if stable else WeightedSums()
+	weighted_sums.add_arrays(x_values, y_values, y_uncertainties)
+	return weighted_sums
+
+def create_replica_weighted_sums(x_samples, y_samples, y_uncertainties, stable = False):
+	"""
+	Creates the WeightedSums of every data set, see WeightedSums.add_replica_arrays
+	if stable is true the CenteredWeightedSums, for data far from 0
+	"""
+	weighted_sums = CenteredWeightedSums() if stable else WeightedSums()
+	weighted_sums.add_replica_arrays(x_samples, y_samples, y_uncertainties)
+	return weighted_sums